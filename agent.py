@@ -15,13 +15,26 @@ Can run as:
 
 import time
 import json
+import random
+import gzip
 import logging
+import threading
 import requests
-import schedule
 import os
+from requests.adapters import HTTPAdapter
+from datetime import datetime
+from apscheduler.schedulers.blocking import BlockingScheduler
+from apscheduler.executors.pool import ThreadPoolExecutor
 from utils.registry_reader import get_db_path_with_fallback
+from utils.db_connector import ConnectionHolder, init_com_thread
+from utils.config_loader import load_config_cached
 from tools.access_db import extract_all_data
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # Configure Logging
 log_file = os.path.join(os.path.dirname(__file__), 'agent.log')
 logging.basicConfig(
@@ -31,15 +44,33 @@ logging.basicConfig(
 )
 logger = logging.getLogger("WindowsAgent")
 
+# Shared HTTP session so the TCP/TLS connection to the central API is kept
+# alive across retries and scheduled runs. Retries are handled in job().
+SESSION = requests.Session()
+_adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=0)
+SESSION.mount("https://", _adapter)
+SESSION.mount("http://", _adapter)
+
+# Set on Ctrl+C / service stop so retry and startup waits return immediately
+SHUTDOWN = threading.Event()
+
+# Append-only queue of unsent payloads (used when batch_uploads is enabled)
+QUEUE_FILE = os.path.join(os.path.dirname(__file__), 'queue.jsonl')
+# Queued payloads the server rejected, set aside for inspection instead of
+# being resent forever
+REJECTED_FILE = os.path.join(os.path.dirname(__file__), 'queue.rejected.jsonl')
+
+# push_body() outcomes
+PUSH_OK = "ok"
+PUSH_FAILED = "failed"      # transient, worth sending again later
+PUSH_REJECTED = "rejected"  # unrecoverable 4xx, resending won't help
+
 
 def load_config():
-    """Load configuration from config.json"""
+    """Load configuration from config.json (cached until the file changes)"""
     config_path = os.path.join(os.path.dirname(__file__), 'config.json')
     try:
-        with open(config_path, 'r') as f:
-            config = json.load(f)
-            logger.info("Configuration loaded successfully")
-            return config
+        return load_config_cached(config_path)
     except FileNotFoundError:
         logger.error(f"config.json not found at {config_path}")
         return None
@@ -48,20 +79,185 @@ def load_config():
         return None
 
 
-def job():
+def encode_payload(payload):
+    """
+    Serialize the payload straight to JSON bytes and gzip them.
+    Uses orjson when available (no intermediate str), stdlib json otherwise.
+    """
+    if orjson is not None:
+        raw = orjson.dumps(payload, option=orjson.OPT_NAIVE_UTC)
+    else:
+        raw = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return gzip.compress(raw, compresslevel=6)
+
+
+def response_snippet(response, limit=500):
+    """
+    Decode only the first `limit` bytes of a streamed response body
+    (for error logging) instead of materializing the whole text.
+    """
+    for chunk in response.iter_content(limit):
+        return chunk[:limit].decode('utf-8', 'replace')
+    return ''
+
+
+def push_body(api_url, body, config, description):
+    """
+    POST a gzip-compressed JSON body to the central API with retries
+    (exponential backoff with full jitter).
+    
+    Args:
+        description: What the body holds, for the success message
+                     (e.g. "120 records")
+    
+    Returns:
+        str: PUSH_OK, PUSH_FAILED or PUSH_REJECTED
+    """
+    headers = {"Content-Type": "application/json", "Content-Encoding": "gzip"}
+    logger.info(f"Payload size: {len(body):,} bytes (gzip)")
+    
+    max_retries = config.get("retry_attempts", 3)
+    retry_base = config.get("retry_base_seconds", 1.0)
+    retry_cap = config.get("retry_max_seconds", 30.0)
+    
+    for attempt in range(1, max_retries + 1):
+        try:
+            print(f"Attempt {attempt}/{max_retries}...")
+            response = SESSION.post(
+                api_url, 
+                data=body,
+                headers=headers,
+                timeout=(10, 300),  # (connect, read) - large uploads need a long read timeout
+                stream=True  # error bodies are only partially read
+            )
+            
+            if response.status_code == 200:
+                response.content  # drain the small ack so the connection returns to the pool
+                logger.info(f"✓ Successfully pushed data (HTTP {response.status_code})")
+                print(f"✓ Successfully pushed {description}!")
+                logger.info("Extraction job complete")
+                return PUSH_OK
+            else:
+                logger.error(f"API Error: HTTP {response.status_code} - {response_snippet(response)}")
+                response.close()
+                print(f"API Error: HTTP {response.status_code}")
+                
+                # Client errors won't be fixed by retrying the same payload
+                # (408 Request Timeout and 429 Too Many Requests are transient)
+                if 400 <= response.status_code < 500 and response.status_code not in (408, 429):
+                    logger.error("Unrecoverable client error, not retrying")
+                    print("FAILED: request rejected by server")
+                    return PUSH_REJECTED
+                
+        except requests.exceptions.RequestException as e:
+            logger.error(f"API request failed (attempt {attempt}/{max_retries}): {e}")
+            print(f"Connection error: {e}")
+            
+        # Wait before retry
+        if attempt < max_retries:
+            retry_delay = random.uniform(0, min(retry_cap, retry_base * (2 ** (attempt - 1))))
+            logger.info(f"Retrying in {retry_delay:.1f} seconds...")
+            print(f"Retrying in {retry_delay:.1f} seconds...")
+            if SHUTDOWN.wait(retry_delay):
+                logger.info("Shutdown requested, abandoning retries")
+                return PUSH_FAILED
+    
+    logger.error(f"Failed to push data after {max_retries} attempts")
+    print(f"FAILED after {max_retries} attempts")
+    return PUSH_FAILED
+
+
+def enqueue_payload(payload):
+    """Append a payload to the local upload queue (one JSON document per line)"""
+    if orjson is not None:
+        line = orjson.dumps(payload, option=orjson.OPT_NAIVE_UTC)
+    else:
+        line = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    with open(QUEUE_FILE, 'ab') as f:
+        f.write(line + b'\n')
+
+
+def save_queue(lines):
+    """Rewrite the upload queue with the lines that were not sent"""
+    if not lines:
+        if os.path.exists(QUEUE_FILE):
+            os.remove(QUEUE_FILE)
+        return
+    tmp_path = QUEUE_FILE + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.writelines(lines)
+    os.replace(tmp_path, QUEUE_FILE)
+
+
+def reject_queued(lines):
+    """Move queue lines the server refused to REJECTED_FILE"""
+    with open(REJECTED_FILE, 'ab') as f:
+        f.writelines(lines)
+    logger.error(f"Moved {len(lines)} rejected extraction(s) to {REJECTED_FILE}")
+
+
+def take_queued_batch(store_id, config):
+    """
+    Build one batched upload from the local queue.
+    
+    A batch is only built once `batch_ticks` extractions are queued or the
+    queue reaches `max_batch_bytes`. Queued lines are spliced into the body
+    as-is (no re-parsing), capped at `max_batch_bytes` of uncompressed JSON.
+    
+    Returns:
+        tuple: (gzip body, queue lines in the batch, remaining queue lines)
+               or None if not ready
+    """
+    batch_ticks = config.get("batch_ticks", 1)
+    max_batch_bytes = config.get("max_batch_bytes", 10 * 1024 * 1024)
+    
+    try:
+        with open(QUEUE_FILE, 'rb') as f:
+            lines = [line for line in f if line.strip()]
+    except FileNotFoundError:
+        return None
+    
+    queued_bytes = sum(len(line) for line in lines)
+    if not lines or (len(lines) < batch_ticks and queued_bytes < max_batch_bytes):
+        return None
+    
+    # Always send at least one payload, even if it exceeds the cap on its own
+    taken = []
+    size = 0
+    for line in lines:
+        if taken and size + len(line) > max_batch_bytes:
+            break
+        taken.append(line.rstrip(b'\r\n'))
+        size += len(line)
+    
+    store_json = json.dumps(store_id).encode('utf-8')
+    raw = b'{"store_id":' + store_json + b',"batches":[' + b','.join(taken) + b']}'
+    logger.info(f"Batching {len(taken)} queued extraction(s) ({len(lines) - len(taken)} left in queue)")
+    return gzip.compress(raw, compresslevel=6), lines[:len(taken)], lines[len(taken):]
+
+
+def job(config=None):
     """
     Main extraction job that runs on schedule.
     
+    Args:
+        config: Parsed configuration dict, or None to load config.json
+    
     Steps:
-    1. Load configuration
+    1. Load configuration (if not provided)
     2. Detect database path (registry or config)
-    3. Extract data from all three Aldelo tables
+    3. Extract data from all three Aldelo tables (connection held per thread)
     4. Push to central API
     """
     logger.info("="*60)
     logger.info("Starting extraction job")
     
-    config = load_config()
+    # Scheduled runs execute on APScheduler worker threads, which need
+    # their own COM initialization before opening an OLEDB connection
+    init_com_thread()
+    
+    if config is None:
+        config = load_config()
     if not config:
         logger.error("Cannot proceed without valid configuration")
         return
@@ -79,14 +275,17 @@ def job():
     
     # 2. EXTRACT DATA
     try:
-        data = extract_all_data(db_path, run_date=None, config=config)
+        # Reuses this thread's connection from the previous run; it is
+        # health-checked first and reopened if it has gone stale
+        data, total_records = extract_all_data(db_path, run_date=None, config=config)
         
         if not data:
             logger.warning("No data extracted or extraction error occurred")
+            # The connection may be broken; reopen it on the next run
+            ConnectionHolder.close_thread()
             return
         
         # Check if all tables are empty
-        total_records = sum(len(v) for v in data.values())
         if total_records == 0:
             logger.info("No records found for today")
             return
@@ -98,46 +297,34 @@ def job():
             "extraction_time": time.strftime('%Y-%m-%d %H:%M:%S')
         }
         
+        if config.get("batch_uploads", False):
+            # Queue this extraction and only upload once enough has accumulated
+            enqueue_payload(payload)
+            batch = take_queued_batch(store_id, config)
+            if batch is None:
+                logger.info("Extraction queued for the next batched upload")
+                return
+            
+            body, taken, remaining = batch
+            logger.info("Pushing queued batch to central API...")
+            print("Pushing queued batch to central API...")
+            result = push_body(api_url, body, config, f"{len(taken)} queued extraction(s)")
+            if result == PUSH_REJECTED:
+                # Resending would fail the same way and hold up everything behind it
+                reject_queued(taken)
+            if result != PUSH_FAILED:
+                save_queue(remaining)
+            return
+        
         logger.info(f"Pushing {total_records} records to central API...")
         print(f"Pushing {total_records} records to central API...")
         
-        # Retry logic for API push
-        max_retries = config.get("retry_attempts", 3)
-        retry_delay = config.get("retry_delay_seconds", 60)
-        
-        for attempt in range(1, max_retries + 1):
-            try:
-                print(f"Attempt {attempt}/{max_retries}...")
-                response = requests.post(
-                    api_url, 
-                    json=payload,
-                    timeout=300  # Increased from 30 to 300 seconds
-                )
-                
-                if response.status_code == 200:
-                    logger.info(f"✓ Successfully pushed data (HTTP {response.status_code})")
-                    print(f"✓ Successfully pushed {total_records} records!")
-                    logger.info("Extraction job complete")
-                    return
-                else:
-                    logger.error(f"API Error: HTTP {response.status_code} - {response.text[:500]}")
-                    print(f"API Error: HTTP {response.status_code}")
-                    
-            except requests.exceptions.RequestException as e:
-                logger.error(f"API request failed (attempt {attempt}/{max_retries}): {e}")
-                print(f"Connection error: {e}")
-                
-            # Wait before retry
-            if attempt < max_retries:
-                logger.info(f"Retrying in {retry_delay} seconds...")
-                print(f"Retrying in {retry_delay} seconds...")
-                time.sleep(retry_delay)
-        
-        logger.error(f"Failed to push data after {max_retries} attempts")
-        print(f"FAILED after {max_retries} attempts")
+        # Serialize + compress once, reused by every retry attempt
+        push_body(api_url, encode_payload(payload), config, f"{total_records} records")
         
     except Exception as e:
         logger.error(f"Job failed with exception: {e}", exc_info=True)
+        ConnectionHolder.close_thread()
 
 
 def main():
@@ -158,18 +345,34 @@ def main():
         interval = 30
         logger.warning(f"Using default extraction interval: {interval} minutes")
     
-    # Schedule logic
-    schedule.every(interval).minutes.do(job)
+    # Spread fleet-wide restarts (Windows Update, power events) so all
+    # agents don't hit the central API at the same moment.
+    # Done before scheduling so the interval runs are offset as well.
+    max_jitter = (config or {}).get("startup_jitter_seconds", interval * 60 * 0.25)
+    startup_jitter = random.uniform(0, max_jitter)
+    logger.info(f"Startup jitter: {startup_jitter:.1f}s")
+    if SHUTDOWN.wait(startup_jitter):
+        return
     
-    # Run once on startup
-    logger.info("Running initial extraction job...")
-    job()
+    # Schedule logic: the scheduler sleeps until the next fire time instead of
+    # polling every second. A slow extraction never overlaps with the next run
+    # and missed runs are coalesced into a single one. Every run, including
+    # the initial one, goes to the same single worker thread so the database
+    # connection it holds is reused instead of one being opened per thread.
+    scheduler = BlockingScheduler(executors={"default": ThreadPoolExecutor(max_workers=1)})
+    scheduler.add_job(
+        job,  # load_config() is cached, so scheduled runs only re-parse an edited config.json
+        'interval',
+        minutes=interval,
+        next_run_time=datetime.now(),  # run once on startup
+        max_instances=1,
+        coalesce=True,
+        misfire_grace_time=interval * 60
+    )
     
     # Main loop
     logger.info(f"Entering main loop (extraction every {interval} minutes)")
-    while True:
-        schedule.run_pending()
-        time.sleep(1)
+    scheduler.start()
 
 
 if __name__ == "__main__":
@@ -179,4 +382,8 @@ if __name__ == "__main__":
         logger.info("Agent stopped by user (Ctrl+C)")
     except Exception as e:
         logger.error(f"Agent crashed: {e}", exc_info=True)
+    finally:
+        # Wake any job still waiting between retries in a scheduler thread
+        SHUTDOWN.set()
+        ConnectionHolder.close_all()
 
@@ -6,6 +6,8 @@ import logging
 import requests
 import datetime
 import traceback
+import concurrent.futures
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, List
 
 # Setup simple logging to both file and console
@@ -20,6 +22,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger("AgentDoctor")
 
+# Stops after one row, unlike COUNT(*) which scans the whole table under Jet
+PROBE_SQL = "SELECT TOP 1 1 FROM Orderheaders"
+
 def print_section(title):
     print("\n" + "="*60)
     print(f" {title}")
@@ -86,11 +91,13 @@ def check_db_file(db_path: str) -> bool:
         
     logger.info("✅ Database file exists")
     
-    # Check permissions
+    # Check permissions without opening the file (avoids contending with
+    # Aldelo's lock on a live database)
     try:
-        with open(db_path, 'rb') as f:
-            header = f.read(10)
-        logger.info("✅ Database file is readable")
+        if not os.access(db_path, os.R_OK):
+            raise PermissionError(db_path)
+        size = os.stat(db_path).st_size
+        logger.info(f"✅ Database file is readable ({size / 1e6:.1f} MB)")
         return True
     except PermissionError:
         logger.error("❌ PERMISSION DENIED: Cannot read database file. Try running as Administrator.")
@@ -99,12 +106,43 @@ def check_db_file(db_path: str) -> bool:
         logger.error(f"❌ Error reading file: {e}")
         return False
 
+# Hostname -> IP, resolved once per doctor run
+_DNS_CACHE = {}
+
+def resolve(host: str, timeout: float = 3) -> str:
+    """Resolve host with a hard timeout (gethostbyname can hang ~30s on a broken resolver)."""
+    if host not in _DNS_CACHE:
+        executor = ThreadPoolExecutor(max_workers=1)
+        future = executor.submit(socket.getaddrinfo, host, 443, type=socket.SOCK_STREAM)
+        executor.shutdown(wait=False)
+        try:
+            infos = future.result(timeout=timeout)
+        except concurrent.futures.TimeoutError:
+            raise TimeoutError(f"DNS lookup timed out after {timeout}s")
+        _DNS_CACHE[host] = infos[0][4][0]
+    return _DNS_CACHE[host]
+
+def _probe_internet():
+    socket.create_connection(("8.8.8.8", 53), timeout=3).close()
+
 def check_connectivity(url: str):
     print_section("3. CONNECTIVITY CHECK")
     
+    hostname = url.split("//")[-1].split("/")[0]
+    # Check health endpoint if possible, else root
+    base_url = url.rsplit('/api', 1)[0]
+    health_url = f"{base_url}/api/health"
+    
+    # The three probes are independent, so run them concurrently and
+    # report the results in order
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        f_internet = executor.submit(_probe_internet)
+        f_dns = executor.submit(resolve, hostname)
+        f_http = executor.submit(requests.get, health_url, timeout=10)
+    
     # 1. Internet Check
     try:
-        socket.create_connection(("8.8.8.8", 53), timeout=3)
+        f_internet.result()
         logger.info("✅ Internet connection active")
     except OSError:
         logger.error("❌ NO INTERNET CONNECTION")
@@ -112,8 +150,7 @@ def check_connectivity(url: str):
 
     # 2. DNS Resolution
     try:
-        hostname = url.split("//")[-1].split("/")[0]
-        ip = socket.gethostbyname(hostname)
+        ip = f_dns.result()
         logger.info(f"✅ DNS Resolved {hostname} -> {ip}")
     except Exception as e:
         logger.error(f"❌ DNS FAILED for {url}: {e}")
@@ -121,12 +158,8 @@ def check_connectivity(url: str):
         
     # 3. HTTP Check
     try:
-        # Check health endpoint if possible, else root
-        base_url = url.rsplit('/api', 1)[0]
-        health_url = f"{base_url}/api/health"
-        
         logger.info(f"  Pinging {health_url}...")
-        resp = requests.get(health_url, timeout=10)
+        resp = f_http.result()
         
         if resp.status_code == 200:
             logger.info(f"✅ API Health Check PASSED (200 OK)")
@@ -159,9 +192,9 @@ def test_db_connection(db_path: str):
         try:
             conn = pyodbc.connect(conn_str_odbc)
             cursor = conn.cursor()
-            cursor.execute("SELECT COUNT(*) FROM Orderheaders")
-            count = cursor.fetchone()[0]
-            logger.info(f"✅ ODBC Connection SUCCESS! (OrderHeaders: {count})")
+            cursor.execute(PROBE_SQL)
+            cursor.fetchone()
+            logger.info("✅ ODBC Connection SUCCESS! (OrderHeaders reachable)")
             conn.close()
             success = True
         except Exception as e:
@@ -180,9 +213,9 @@ def test_db_connection(db_path: str):
                 conn = win32com.client.Dispatch('ADODB.Connection')
                 conn.Open(conn_str_oledb)
                 rs = win32com.client.Dispatch('ADODB.Recordset')
-                rs.Open("SELECT COUNT(*) FROM Orderheaders", conn)
-                count = rs.Fields(0).Value
-                logger.info(f"✅ OLEDB (ADODB) Connection SUCCESS! (OrderHeaders: {count})")
+                rs.Open(PROBE_SQL, conn)
+                rs.Close()
+                logger.info("✅ OLEDB (ADODB) Connection SUCCESS! (OrderHeaders reachable)")
                 success = True
                 conn.Close()
             except Exception as e:
@@ -7,6 +7,29 @@ from utils.registry_reader import get_db_path_with_fallback
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("DataCheck")
 
+# Rows fetched per driver round-trip
+FETCH_BATCH_SIZE = 1000
+
+# Date column checked for each table
+DATE_COLUMNS = (
+    ('Orderheaders', 'OrderDateTime'),
+    ('Orderpayments', 'PaymentDateTime'),
+    ('AccountInvoiceERP', 'FechaEntrega'),
+)
+
+# (table, oldest_sql, newest_sql, count_sql), built once at import.
+# TOP 1 ... ORDER BY lets Jet answer MIN/MAX from an index on the date
+# column instead of scanning the table.
+DATE_RANGE_QUERIES = tuple(
+    (
+        table,
+        f"SELECT TOP 1 {column} FROM {table} WHERE {column} IS NOT NULL ORDER BY {column} ASC",
+        f"SELECT TOP 1 {column} FROM {table} WHERE {column} IS NOT NULL ORDER BY {column} DESC",
+        f"SELECT COUNT(*) FROM {table}",
+    )
+    for table, column in DATE_COLUMNS
+)
+
 def check_dates():
     config_path = 'config.json'
     if not os.path.exists(config_path):
@@ -25,20 +48,25 @@ def check_dates():
     try:
         conn = get_connection(db_path, strategy="oledb", read_only=True)
         cursor = conn.cursor()
+        # pyodbc arraysize / ADODB Recordset.CacheSize
+        cursor.arraysize = FETCH_BATCH_SIZE
         
-        queries = {
-            'Orderheaders': "SELECT MIN(OrderDateTime), MAX(OrderDateTime), COUNT(*) FROM Orderheaders",
-            'Orderpayments': "SELECT MIN(PaymentDateTime), MAX(PaymentDateTime), COUNT(*) FROM Orderpayments",
-            'AccountInvoiceERP': "SELECT MIN(FechaEntrega), MAX(FechaEntrega), COUNT(*) FROM AccountInvoiceERP"
-        }
-        
-        for table, sql in queries.items():
+        for table, oldest_sql, newest_sql, count_sql in DATE_RANGE_QUERIES:
             print(f"\n--- Data in {table} ---")
             try:
-                cursor.execute(sql)
+                cursor.execute(oldest_sql)
+                rows = cursor.fetchall()
+                min_date = rows[0][0] if rows else None
+                
+                cursor.execute(newest_sql)
+                rows = cursor.fetchall()
+                max_date = rows[0][0] if rows else None
+                
+                cursor.execute(count_sql)
                 rows = cursor.fetchall()
-                if rows:
-                    min_date, max_date, count = rows[0]
+                count = rows[0][0] if rows else 0
+                
+                if count:
                     print(f"Total Rows: {count}")
                     print(f"Oldest Record: {min_date}")
                     print(f"Newest Record: {max_date}")
@@ -7,6 +7,8 @@ from utils.registry_reader import get_db_path_with_fallback
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger("SchemaDiscovery")
 
+TABLES = ('Orderheaders', 'Orderpayments', 'AccountInvoiceERP')
+
 def discover_schema():
     # Load config to get db_path
     config_path = 'config.json'
@@ -28,22 +30,23 @@ def discover_schema():
         conn = get_connection(db_path, strategy="oledb", read_only=True)
         cursor = conn.cursor()
         
-        tables = ['Orderheaders', 'Orderpayments', 'AccountInvoiceERP']
-        
-        for table in tables:
+        for table in TABLES:
             print(f"\n--- Columns in {table} ---")
             try:
-                # OLEDB specific way to get columns or just a failed select to trigger error if needed, 
-                # but better to use a dummy select
-                cursor.execute(f"SELECT TOP 1 * FROM {table}")
-                # For our OLEDB wrapper, fetchall might be needed or just inspecting the recordset
-                # Our OLEDBCursor has a recordset. Let's inspect it.
-                if hasattr(cursor, 'recordset'):
-                    rs = cursor.recordset
-                    for i in range(rs.Fields.Count):
-                        print(f"- {rs.Fields(i).Name}")
+                # Read column names from the schema catalog instead of
+                # selecting a data row
+                if hasattr(conn, 'get_columns'):
+                    columns = conn.get_columns(table)
+                elif hasattr(cursor, 'columns'):
+                    columns = [row.column_name for row in cursor.columns(table=table)]
+                else:
+                    columns = None
+                
+                if columns:
+                    for name in columns:
+                        print(f"- {name}")
                 else:
-                    print("Could not inspect recordset fields")
+                    print("Could not inspect table columns")
             except Exception as e:
                 print(f"Error reading {table}: {e}")
         
@@ -10,6 +10,18 @@ from utils.registry_reader import get_db_path_with_fallback
 
 logging.basicConfig(level=logging.INFO)
 
+COUNT_SQL = "SELECT COUNT(*) AS cnt FROM [{}]"
+
+# Table name fragments that hint at product/order item data
+KEYWORDS = ('detail', 'item', 'product', 'order', 'sales', 'menu')
+
+# Common Aldelo table names, probed when the schema catalog is unavailable
+COMMON_TABLES = (
+    'Orderheaders', 'OrderDetails', 'OrderItems', 'SalesDetails',
+    'Products', 'MenuItems', 'Items', 'Employees', 'Customers',
+    'Categories', 'Stations', 'Tables', 'Orderpayments'
+)
+
 def explore_all_tables():
     """List ALL tables in the Aldelo database."""
     
@@ -37,19 +49,11 @@ def explore_all_tables():
         conn = get_connection(db_path, strategy="oledb", read_only=True)
         cursor = conn.cursor()
         
-        # Get tables using ADOX with the raw ADODB connection
+        # Get tables from the OLEDB schema rowset (catalog only, no data pages)
         print("Discovering all tables...\n")
         
         try:
-            import win32com.client
-            cat = win32com.client.Dispatch("ADOX.Catalog")
-            # Access the raw ADODB connection from our wrapper
-            cat.ActiveConnection = conn.conn  # The internal conn attribute
-            
-            user_tables = []
-            for table in cat.Tables:
-                if table.Type == "TABLE":
-                    user_tables.append(table.Name)
+            user_tables = conn.get_tables()
             
             print(f"Found {len(user_tables)} tables!\n")
             print("-" * 40)
@@ -69,26 +73,20 @@ def explore_all_tables():
                 print("─"*60)
                 
                 try:
-                    cursor.execute(f"SELECT TOP 1 * FROM [{table_name}]")
+                    columns = conn.get_columns(table_name)
+                    
+                    print(f"Columns: {', '.join(columns[:8])}")
+                    if len(columns) > 8:
+                        print(f"         ... +{len(columns)-8} more")
                     
-                    if hasattr(cursor, 'recordset') and cursor.recordset:
-                        rs = cursor.recordset
-                        columns = []
-                        for i in range(rs.Fields.Count):
-                            columns.append(rs.Fields(i).Name)
-                        
-                        print(f"Columns: {', '.join(columns[:8])}")
-                        if len(columns) > 8:
-                            print(f"         ... +{len(columns)-8} more")
-                        
-                        # Count rows
-                        try:
-                            cursor.execute(f"SELECT COUNT(*) AS cnt FROM [{table_name}]")
-                            if cursor.recordset and not cursor.recordset.EOF:
-                                count = cursor.recordset.Fields(0).Value
-                                print(f"Rows: {count:,}")
-                        except:
-                            pass
+                    # Count rows
+                    try:
+                        cursor.execute(COUNT_SQL.format(table_name))
+                        if cursor.recordset and not cursor.recordset.EOF:
+                            count = cursor.recordset.Fields(0).Value
+                            print(f"Rows: {count:,}")
+                    except:
+                        pass
                             
                 except Exception as e:
                     print(f"  Error: {e}")
@@ -98,8 +96,7 @@ def explore_all_tables():
             print("  🔍 TABLES FOR PRODUCT DATA")
             print("=" * 70)
             
-            keywords = ['detail', 'item', 'product', 'order', 'sales', 'menu']
-            found = [t for t in user_tables if any(k in t.lower() for k in keywords)]
+            found = [t for t in user_tables if any(k in t.lower() for k in KEYWORDS)]
             
             if found:
                 print("\nThese tables likely contain product/order item data:")
@@ -110,20 +107,14 @@ def explore_all_tables():
                 print("Check the full list above.")
                 
         except Exception as e:
-            print(f"ADOX Error: {e}")
+            print(f"Schema Error: {e}")
             print("\nTrying alternative method...")
             
             # Fallback: check common Aldelo table names
-            common_tables = [
-                'Orderheaders', 'OrderDetails', 'OrderItems', 'SalesDetails',
-                'Products', 'MenuItems', 'Items', 'Employees', 'Customers',
-                'Categories', 'Stations', 'Tables', 'Orderpayments'
-            ]
-            
             print("\nChecking common Aldelo tables:")
-            for table in common_tables:
+            for table in COMMON_TABLES:
                 try:
-                    cursor.execute(f"SELECT COUNT(*) AS c FROM [{table}]")
+                    cursor.execute(COUNT_SQL.format(table))
                     if cursor.recordset and not cursor.recordset.EOF:
                         count = cursor.recordset.Fields(0).Value
                         print(f"  ✅ {table} ({count:,} rows)")
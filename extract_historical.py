@@ -17,10 +17,21 @@ Requirements:
 import os
 import sys
 import json
+import gzip
+import calendar
 import time
+import queue
 import logging
+import threading
 import requests
-from datetime import datetime, timedelta
+from collections import defaultdict
+from datetime import date, datetime
+from requests.adapters import HTTPAdapter
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 # Setup logging
 logging.basicConfig(
@@ -33,40 +44,78 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Orders per POST (each batch also carries those orders' payments/products)
+UPLOAD_BATCH_ORDERS = 1000
+# Attempts per batch; waits 15s, 30s, 60s... (capped at 480s) plus up to 5s jitter
+UPLOAD_ATTEMPTS = 5
+
+# Keep-alive connections shared by all upload threads
+SESSION = requests.Session()
+_adapter = HTTPAdapter(pool_connections=8, pool_maxsize=16)
+SESSION.mount("https://", _adapter)
+SESSION.mount("http://", _adapter)
+
 # Add parent directory to path
 script_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, script_dir)
 
-from tools.access_db import extract_all_data
+from tools.access_db import extract_all_data, iter_month_bundle, has_orders_in_range
+from utils.db_connector import get_connection, init_com_thread
+from utils.backoff import backoff_delay
+from utils.config_loader import load_config_cached
+
+
+class RateLimiter:
+    """
+    Token bucket limiting how often uploads start, so the server is never
+    flooded while idle senders don't wait for nothing.
+    """
+    
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        """Block until a token is available."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
 
 
 def load_config():
-    """Load configuration from config.json"""
-    config_path = os.path.join(script_dir, 'config.json')
-    with open(config_path, 'r') as f:
-        return json.load(f)
+    """Load configuration from config.json (cached until the file changes)"""
+    return load_config_cached(os.path.join(script_dir, 'config.json'))
 
 
-def get_oldest_date(db_path):
+def get_oldest_date(conn):
     """
     Auto-detect the oldest date in the Aldelo database.
     Queries MIN(OrderDateTime) from Orderheaders to find the earliest record.
     
+    Args:
+        conn: Open database connection
+    
     Returns:
         tuple: (year, month) of the oldest record, or (2024, 1) as fallback.
     """
-    from utils.db_connector import get_connection
-    
     try:
-        conn = get_connection(db_path, strategy="oledb", read_only=True)
         cursor = conn.cursor()
         cursor.execute("SELECT MIN(OrderDateTime) FROM Orderheaders WHERE OrderDateTime IS NOT NULL")
-        result = cursor.fetchall()
+        result = cursor.fetchone()
         cursor.close()
-        conn.close()
         
-        if result and result[0] and result[0][0]:
-            oldest = result[0][0]
+        if result and result[0]:
+            oldest = result[0]
             logger.info(f"Oldest record found: {oldest}")
             return oldest.year, oldest.month
         
@@ -79,93 +128,199 @@ def get_oldest_date(db_path):
         return 2024, 1
 
 
-def extract_month_data(db_path, year, month, config):
-    """Extract data for a specific month."""
-    # Calculate start and end dates for the month
-    start_date = f"{year}-{month:02d}-01"
-    if month == 12:
-        end_date = f"{year + 1}-01-01"
-    else:
-        end_date = f"{year}-{month + 1:02d}-01"
-    
-    # Adjust end date to last day of month
-    end_dt = datetime.strptime(end_date, '%Y-%m-%d') - timedelta(days=1)
-    end_date = end_dt.strftime('%Y-%m-%d')
+def extract_month_data(conn, year, month, config, cursor=None):
+    """
+    Extract data for a specific month over an open connection.
+    Yields the month in chunks of `historical_chunk_rows` rows (default 5000)
+    so a busy month never has to be held in memory all at once.
+    Passing the same `cursor` for each month reuses its prepared query.
+    """
+    # First and last day of the month
+    last_day = calendar.monthrange(year, month)[1]
+    start_date = date(year, month, 1)
+    end_date = date(year, month, last_day)
     
     logger.info(f"📅 Extracting {year}-{month:02d} ({start_date} to {end_date})")
     
-    # Create a config with specific dates
-    month_config = config.copy()
-    month_config['start_date'] = start_date
-    month_config['end_date'] = end_date
-    month_config['lookback_days'] = 31  # Max for a month
+    if not has_orders_in_range(conn, start_date, end_date, cursor=cursor):
+        logger.info(f"  → {year}-{month:02d}: no orders, skipping")
+        return
+    
+    chunk_rows = config.get("historical_chunk_rows", 5000)
     
-    # Use the existing extract function with date override
-    from utils.db_connector import get_connection
+    # Extract orderheaders, orderpayments, AND orderdetails for this month
+    # in a single round-trip, streamed chunk by chunk
+    for chunk in iter_month_bundle(conn, start_date, end_date, chunk_size=chunk_rows, cursor=cursor):
+        logger.info(f"  → {year}-{month:02d} chunk: Orders: {len(chunk['orderheaders'])}, "
+                    f"Payments: {len(chunk['orderpayments'])}, Products: {len(chunk['orderdetails'])}")
+        chunk["account_invoice_erp"] = []  # Skip for historical
+        yield chunk
+
+
+def iter_months(start_year, start_month, end_year, end_month):
+    """Yield (year, month) from the start month up to and including the end month."""
+    year, month = start_year, start_month
+    while year < end_year or (year == end_year and month <= end_month):
+        yield year, month
+        month += 1
+        if month > 12:
+            month = 1
+            year += 1
+
+
+def _extract_worker(db_path, config, months, results):
+    """
+    Extract months from the queue on this thread's own connection, which
+    is opened on first use and reused for every month the thread handles.
     
+    Puts ("chunk", year, month, data) for every streamed chunk,
+    ("done", year, month, ok, seconds) after each month and None when finished.
+    """
+    init_com_thread()
+    conn = None
+    cursor = None
     try:
-        conn = get_connection(db_path, strategy="oledb", read_only=True)
-        
-        # Extract orderheaders, orderpayments, AND orderdetails for this month
-        from tools.access_db import extract_orderheaders, extract_orderpayments, extract_orderdetails
-        
-        orderheaders = extract_orderheaders(conn, start_date, end_date)
-        orderpayments = extract_orderpayments(conn, start_date, end_date)
-        orderdetails = extract_orderdetails(conn, start_date, end_date)  # Products!
-        
-        conn.close()
-        
-        logger.info(f"  → Orders: {len(orderheaders)}, Payments: {len(orderpayments)}, Products: {len(orderdetails)}")
-        
-        return {
-            "orderheaders": orderheaders,
-            "orderpayments": orderpayments,
-            "orderdetails": orderdetails,  # Include product data!
-            "account_invoice_erp": []  # Skip for historical
-        }
-        
-    except Exception as e:
-        logger.error(f"Error extracting {year}-{month:02d}: {e}")
-        return None
+        while True:
+            try:
+                year, month = months.get_nowait()
+            except queue.Empty:
+                break
+            
+            started = time.monotonic()
+            ok = False
+            try:
+                if conn is None:
+                    conn = get_connection(db_path, strategy="oledb", read_only=True)
+                    cursor = conn.cursor()
+                for chunk in extract_month_data(conn, year, month, config, cursor=cursor):
+                    results.put(("chunk", year, month, chunk))
+                ok = True
+            except Exception as e:
+                logger.error(f"Error extracting {year}-{month:02d}: {e}")
+            
+            if not ok and conn is not None:
+                # The connection may be broken; reopen it for the next month
+                if cursor is not None:
+                    cursor.close()
+                conn.close()
+                conn = None
+                cursor = None
+            
+            results.put(("done", year, month, ok, time.monotonic() - started))
+    finally:
+        if conn is not None:
+            if cursor is not None:
+                cursor.close()
+            conn.close()
+        results.put(None)
 
 
-def send_to_server(data, store_id, server_url):
-    """Send extracted data to the central server."""
-    if not data:
-        return False
-        
-    total_records = len(data.get('orderheaders', []))
-    if total_records == 0:
-        logger.info("  → No records to send")
-        return True
+def _upload_worker(uploads, store_id, server_url, limiter):
+    """
+    Consume upload batches from the queue and POST them. Every sender
+    works through batches independently, so a slow batch never holds up
+    the others (or the extractors feeding the queue).
+    """
+    while True:
+        item = uploads.get()
+        if item is None:
+            break
+        year, month, batch = item
+        limiter.acquire()
+        success = _post_batch(batch, store_id, server_url)
+        if not success:
+            logger.warning(f"  ⚠️ Will retry {year}-{month:02d} later")
+
+
+def split_upload_batches(data, batch_size=UPLOAD_BATCH_ORDERS):
+    """
+    Split extracted data into batches of up to `batch_size` orders, each
+    carrying the payments and products of its own orders. Children whose
+    order is not in `data` (it arrived in another chunk) are sent in
+    trailing batches of their own.
+    """
+    payments_by_order = defaultdict(list)
+    for payment in data.get('orderpayments', []):
+        payments_by_order[payment['order_id']].append(payment)
+    details_by_order = defaultdict(list)
+    for detail in data.get('orderdetails', []):
+        details_by_order[detail['order_id']].append(detail)
+    
+    orderheaders = data.get('orderheaders', [])
+    for i in range(0, len(orderheaders), batch_size):
+        orders = orderheaders[i:i + batch_size]
+        payments = []
+        details = []
+        for order in orders:
+            payments.extend(payments_by_order.pop(order['order_id'], ()))
+            details.extend(details_by_order.pop(order['order_id'], ()))
+        yield {
+            "orderheaders": orders,
+            "orderpayments": payments,
+            "orderdetails": details,
+            "account_invoice_erp": []
+        }
     
+    payments = [p for group in payments_by_order.values() for p in group]
+    details = [d for group in details_by_order.values() for d in group]
+    invoices = data.get('account_invoice_erp', [])
+    for i in range(0, max(len(payments), len(details), len(invoices)), batch_size):
+        yield {
+            "orderheaders": [],
+            "orderpayments": payments[i:i + batch_size],
+            "orderdetails": details[i:i + batch_size],
+            "account_invoice_erp": invoices[i:i + batch_size]
+        }
+
+
+def _post_batch(batch, store_id, server_url):
+    """
+    POST one batch; the read timeout scales with the batch size.
+    Timeouts, connection errors and 5xx/408/429 responses are retried with
+    jittered exponential backoff; other client errors fail immediately.
+    """
+    records = sum(len(v) for v in batch.values())
     payload = {
         "store_id": store_id,
-        "data": data
+        "data": batch
     }
+    # Serialize and compress once up front; retries resend the same bytes.
+    # Level 3 keeps CPU low while still shrinking the repetitive rows several-fold.
+    raw = orjson.dumps(payload) if orjson else json.dumps(payload).encode("utf-8")
+    body = gzip.compress(raw, compresslevel=3)
     
-    try:
-        logger.info(f"  📤 Sending {total_records} orders to server...")
-        response = requests.post(
-            server_url,
-            json=payload,
-            timeout=120  # 2 minute timeout for large batches
-        )
-        
-        if response.ok:
-            result = response.json()
-            logger.info(f"  ✅ Success: {result.get('message', 'OK')}")
-            return True
-        else:
+    for attempt in range(UPLOAD_ATTEMPTS):
+        try:
+            response = SESSION.post(
+                server_url,
+                data=body,
+                headers={"Content-Type": "application/json", "Content-Encoding": "gzip"},
+                timeout=(10, min(120, 30 + records // 100))
+            )
+            
+            if response.ok:
+                result = response.json()
+                logger.info(f"  ✅ Success ({records} records): {result.get('message', 'OK')}")
+                return True
+            
             logger.error(f"  ❌ Server error: {response.status_code} - {response.text}")
+            if response.status_code < 500 and response.status_code not in (408, 429):
+                return False
+                
+        except requests.Timeout:
+            logger.error("  ❌ Request timeout")
+        except requests.ConnectionError as e:
+            logger.error(f"  ❌ Connection error: {e}")
+        except Exception as e:
+            logger.error(f"  ❌ Send error: {e}")
             return False
-            
-    except requests.Timeout:
-        logger.error("  ❌ Request timeout - try again")
-        return False
-    except Exception as e:
-        logger.error(f"  ❌ Send error: {e}")
-        return False
+        
+        if attempt < UPLOAD_ATTEMPTS - 1:
+            delay = backoff_delay(attempt, base=15, cap=480, jitter=5)
+            logger.info(f"  ↻ Retrying batch in {delay:.0f}s ({attempt + 2}/{UPLOAD_ATTEMPTS})...")
+            time.sleep(delay)
+    
+    return False
 
 
 def main():
@@ -204,45 +359,80 @@ def main():
     # Determine date range to extract
     # AUTO-DETECT: Find the oldest record in the database
     current_date = datetime.now()
-    start_year, start_month = get_oldest_date(db_path)
+    try:
+        conn = get_connection(db_path, strategy="oledb", read_only=True)
+        try:
+            start_year, start_month = get_oldest_date(conn)
+        finally:
+            conn.close()
+    except Exception as e:
+        logger.error(f"Could not detect oldest date: {e}")
+        logger.info("Using fallback: 2024-01")
+        start_year, start_month = 2024, 1
     
     logger.info(f"\n🔄 Starting extraction from {start_year}-{start_month:02d} to {current_date.strftime('%Y-%m')}\n")
     
-    # Extract month by month
+    # Extract months concurrently (each worker keeps its own connection) and
+    # hand upload batches to a pool of senders through a bounded queue, so
+    # POSTs for one chunk overlap with extracting and sending the next
+    extract_workers = config.get("historical_workers", 4)
+    upload_workers = config.get("historical_upload_workers", 4)
+    limiter = RateLimiter(config.get("historical_uploads_per_second", 4.0), burst=upload_workers)
+    uploads = queue.Queue(maxsize=upload_workers * 2)
+    
+    senders = [
+        threading.Thread(target=_upload_worker, args=(uploads, store_id, server_url, limiter), daemon=True)
+        for _ in range(upload_workers)
+    ]
+    for sender in senders:
+        sender.start()
+    
+    months = queue.Queue()
+    for year, month in iter_months(start_year, start_month, current_date.year, current_date.month):
+        months.put((year, month))
+    
+    # Bounded so extractors pause (instead of piling up months in memory)
+    # while the uploaders are behind
+    results = queue.Queue(maxsize=extract_workers)
+    extractors = [
+        threading.Thread(target=_extract_worker, args=(db_path, config, months, results), daemon=True)
+        for _ in range(extract_workers)
+    ]
+    for extractor in extractors:
+        extractor.start()
+    
     total_sent = 0
     months_processed = 0
+    finished = 0
     
-    year = start_year
-    month = start_month
-    
-    while True:
-        # Check if we've gone past current date
-        if year > current_date.year or (year == current_date.year and month > current_date.month):
-            break
-        
-        # Extract this month's data
-        data = extract_month_data(db_path, year, month, config)
+    while finished < len(extractors):
+        item = results.get()
+        if item is None:
+            finished += 1
+            continue
         
-        if data:
-            records = len(data.get('orderheaders', []))
-            total_sent += records
-            
-            if records > 0:
-                # Send to server
-                success = send_to_server(data, store_id, server_url)
-                if not success:
-                    logger.warning(f"  ⚠️ Will retry {year}-{month:02d} later")
+        if item[0] == "chunk":
+            _, year, month, data = item
+            total_sent += len(data['orderheaders'])
             
-            months_processed += 1
-        
-        # Move to next month
-        month += 1
-        if month > 12:
-            month = 1
-            year += 1
-        
-        # Small delay to avoid overwhelming the server
-        time.sleep(1)
+            if any(data.values()):
+                batches = list(split_upload_batches(data))
+                records = sum(len(v) for v in data.values())
+                logger.info(f"  📤 Queueing {records} records from {year}-{month:02d} in {len(batches)} batch(es)...")
+                for batch in batches:
+                    # Blocks while the uploaders are behind
+                    uploads.put((year, month, batch))
+        else:
+            _, year, month, ok, elapsed = item
+            logger.info(f"  ⏱ {year}-{month:02d} extracted in {elapsed:.1f}s")
+            if ok:
+                months_processed += 1
+    
+    # Let the uploaders drain the queue, then stop them
+    for _ in senders:
+        uploads.put(None)
+    for sender in senders:
+        sender.join()
     
     # Summary
     print(f"""
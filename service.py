@@ -39,8 +39,7 @@ except ImportError:
 # Add current directory to path so we can import agent
 sys.path.insert(0, os.path.dirname(__file__))
 
-from agent import job, load_config
-import schedule
+from agent import job, load_config, SHUTDOWN
 
 
 class AldeloDataService(win32serviceutil.ServiceFramework):
@@ -72,6 +71,8 @@ class AldeloDataService(win32serviceutil.ServiceFramework):
         self.logger.info("Service stop requested")
         self.ReportServiceStatus(win32service.SERVICE_STOP_PENDING)
         win32event.SetEvent(self.stop_event)
+        # Interrupt a job that is waiting between API retries
+        SHUTDOWN.set()
         self.is_running = False
         self.logger.info("Service stopped")
     
@@ -105,9 +106,6 @@ class AldeloDataService(win32serviceutil.ServiceFramework):
         interval = config.get("extraction_interval_minutes", 30)
         self.logger.info(f"Extraction interval: {interval} minutes")
         
-        # Schedule the extraction job
-        schedule.every(interval).minutes.do(job)
-        
         # Run once on startup
         self.logger.info("Running initial extraction job...")
         try:
@@ -115,19 +113,25 @@ class AldeloDataService(win32serviceutil.ServiceFramework):
         except Exception as e:
             self.logger.error(f"Initial job failed: {e}", exc_info=True)
         
-        # Main service loop
+        # Main service loop: sleep on the stop event until the next run is due
+        # instead of waking every second to poll a schedule
         self.logger.info("Entering service main loop")
+        next_run = time.monotonic() + interval * 60
         
         while self.is_running:
+            wait_ms = max(0, int((next_run - time.monotonic()) * 1000))
+            
             # Check if stop event is signaled
-            if win32event.WaitForSingleObject(self.stop_event, 1000) == win32event.WAIT_OBJECT_0:
+            if win32event.WaitForSingleObject(self.stop_event, wait_ms) == win32event.WAIT_OBJECT_0:
                 break
             
-            # Run scheduled jobs
             try:
-                schedule.run_pending()
+                job()
             except Exception as e:
                 self.logger.error(f"Scheduled job error: {e}", exc_info=True)
+            
+            # Next run is one interval after this one finished
+            next_run = time.monotonic() + interval * 60
         
         self.logger.info("Service main loop exited")
 
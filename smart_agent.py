@@ -15,7 +15,11 @@ Can run as:
 """
 
 import time
+import random
+import copy
 import json
+import gzip
+import hashlib
 import logging
 import sqlite3
 import requests
@@ -23,13 +27,32 @@ import schedule
 import os
 import sys
 import uuid
+import queue
+import atexit
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from datetime import datetime, timedelta
 from pathlib import Path
+from requests.adapters import HTTPAdapter
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
 
 # Add parent to path for imports
 sys.path.insert(0, os.path.dirname(__file__))
 from utils.registry_reader import get_db_path_with_fallback
-from tools.access_db import extract_all_data
+from tools.access_db import extract_all_data, extract_all_data_iter
+from utils.backoff import backoff_delay
+from utils.config_loader import load_config_cached
 
 # =============================================================================
 # CONFIGURATION
@@ -38,29 +61,103 @@ from tools.access_db import extract_all_data
 AGENT_VERSION = "2.0.0"
 BUFFER_DB_NAME = "sync_buffer.db"
 HEARTBEAT_INTERVAL_MINUTES = 5
+HEARTBEAT_MAX_SKIPS = 5  # Unchanged heartbeats skipped before a keep-alive is sent anyway
 MAX_BUFFER_AGE_DAYS = 7  # Clean old buffered data after this
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUP_COUNT = 5
+BUFFER_MMAP_SIZE = 256 * 1024 * 1024  # Memory-map up to 256MB of the buffer DB
+GZIP_MIN_BYTES = 4096  # Compress push bodies larger than this (level 1: near-max ratio, fastest)
+
+# Extraction lists that are split into chunks (keys returned by extract_all_data)
+CHUNK_KINDS = ('orderheaders', 'orderpayments', 'account_invoice_erp', 'orderdetails')
+# Shared placeholder for the lists a chunk doesn't carry (serializes as [])
+_EMPTY = ()
+# Connection-level failures from whichever HTTP client is in use
+HTTP_ERRORS = (requests.exceptions.RequestException,) + ((httpx.HTTPError,) if httpx else ())
+
+
+def encode_json(obj) -> bytes:
+    """Serialize to UTF-8 JSON bytes (orjson when available)."""
+    return orjson.dumps(obj) if orjson else json.dumps(obj).encode("utf-8")
+
+
+def compress_body(body: bytes) -> tuple:
+    """Gzip a JSON body when it is large enough to be worth it. Returns (body, extra headers)."""
+    if len(body) > GZIP_MIN_BYTES:
+        return gzip.compress(body, compresslevel=1), {"Content-Encoding": "gzip"}
+    return body, None
+
 
 # =============================================================================
 # LOGGING SETUP
 # =============================================================================
 
+class JsonFormatter(logging.Formatter):
+    """Format records as one properly escaped JSON object per line."""
+    
+    def format(self, record):
+        entry = {
+            "timestamp": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            # Rendered by TracebackQueueHandler before the record was queued
+            entry["exception"] = record.exc_text
+        if orjson:
+            return orjson.dumps(entry).decode("utf-8")
+        return json.dumps(entry, ensure_ascii=False)
+
+
+# Renders tracebacks for TracebackQueueHandler
+_TRACEBACK_FORMATTER = logging.Formatter()
+
+
+class TracebackQueueHandler(QueueHandler):
+    """
+    QueueHandler that keeps the traceback apart from the message.
+    
+    The stock prepare() folds the formatted traceback into msg and drops
+    exc_info, so JsonFormatter could no longer emit it as "exception".
+    Here the traceback is rendered into exc_text instead, so the queued
+    record still doesn't keep the traceback's frames alive.
+    """
+    
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = _TRACEBACK_FORMATTER.formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
 def setup_logging():
-    """Configure rotating file and console logging."""
+    """
+    Configure rotating file and console logging.
+    
+    Log calls only enqueue the record; a QueueListener thread formats and
+    writes it, so disk I/O never blocks the agent.
+    """
     log_dir = Path(__file__).parent / "logs"
     log_dir.mkdir(exist_ok=True)
     
     log_file = log_dir / f"agent_{datetime.now().strftime('%Y%m%d')}.log"
     
     # Create formatters
-    file_formatter = logging.Formatter(
-        '{"timestamp": "%(asctime)s", "level": "%(levelname)s", "logger": "%(name)s", "message": "%(message)s"}'
-    )
+    file_formatter = JsonFormatter()
     console_formatter = logging.Formatter(
         '%(asctime)s - %(levelname)s - %(message)s'
     )
     
-    # File handler
-    file_handler = logging.FileHandler(log_file, encoding='utf-8')
+    # File handler (10MB x 5 backups)
+    file_handler = RotatingFileHandler(
+        log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding='utf-8'
+    )
     file_handler.setLevel(logging.DEBUG)
     file_handler.setFormatter(file_formatter)
     
@@ -69,11 +166,16 @@ def setup_logging():
     console_handler.setLevel(logging.INFO)
     console_handler.setFormatter(console_formatter)
     
+    # Handlers run on the listener thread
+    log_queue = queue.Queue(-1)
+    listener = QueueListener(log_queue, file_handler, console_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    
     # Root logger
     logger = logging.getLogger("SmartAgent")
     logger.setLevel(logging.DEBUG)
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
+    logger.addHandler(TracebackQueueHandler(log_queue))
     
     return logger
 
@@ -87,154 +189,232 @@ class SyncBuffer:
     """
     Local SQLite buffer for offline resilience.
     Stores data when API is unreachable and retries later.
+    
+    One connection is held for the buffer's lifetime (WAL mode) and shared
+    between the scheduler jobs under a lock.
     """
     
     def __init__(self, db_path: str = None):
         if db_path is None:
             db_path = Path(__file__).parent / BUFFER_DB_NAME
         self.db_path = str(db_path)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA temp_store=MEMORY")
+        self.conn.execute(f"PRAGMA mmap_size={BUFFER_MMAP_SIZE}")
+        self._enable_incremental_vacuum()
         self._init_db()
     
+    def _enable_incremental_vacuum(self):
+        """Switch the buffer to auto_vacuum=INCREMENTAL (a one-off VACUUM converts existing files)."""
+        # 2 = INCREMENTAL
+        if self.conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            self.conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            self.conn.execute("VACUUM")
+    
+    @contextmanager
+    def _transaction(self):
+        """Run several statements as one transaction (one fsync)."""
+        with self._lock:
+            self.conn.execute("BEGIN")
+            try:
+                yield self.conn
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+    
+    def close(self):
+        """Close the buffer connection."""
+        with self._lock:
+            self.conn.close()
+    
     def _init_db(self):
         """Initialize buffer database tables."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        # Pending sync records
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS pending_sync (
-                id TEXT PRIMARY KEY,
-                store_id TEXT NOT NULL,
-                payload TEXT NOT NULL,
-                record_count INTEGER,
-                created_at TEXT NOT NULL,
-                retry_count INTEGER DEFAULT 0,
-                last_error TEXT,
-                status TEXT DEFAULT 'pending'
-            )
-        """)
-        
-        # Sync history for reporting
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS sync_history (
-                id TEXT PRIMARY KEY,
-                store_id TEXT NOT NULL,
-                record_count INTEGER,
-                synced_at TEXT NOT NULL,
-                duration_seconds REAL,
-                status TEXT,
-                error_message TEXT
-            )
-        """)
-        
-        # Agent status
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS agent_status (
-                key TEXT PRIMARY KEY,
-                value TEXT,
-                updated_at TEXT
-            )
-        """)
+        with self._transaction() as conn:
+            # Pending sync records
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS pending_sync (
+                    id TEXT PRIMARY KEY,
+                    store_id TEXT NOT NULL,
+                    payload BLOB NOT NULL,
+                    record_count INTEGER,
+                    created_at TEXT NOT NULL,
+                    retry_count INTEGER DEFAULT 0,
+                    last_error TEXT,
+                    status TEXT DEFAULT 'pending',
+                    payload_hash TEXT
+                )
+            """)
+            
+            # Buffers created before payload_hash existed
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(pending_sync)")]
+            if "payload_hash" not in columns:
+                conn.execute("ALTER TABLE pending_sync ADD COLUMN payload_hash TEXT")
+            conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS ix_pending_payload_hash ON pending_sync(payload_hash)")
+            
+            # Sync history for reporting
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS sync_history (
+                    id TEXT PRIMARY KEY,
+                    store_id TEXT NOT NULL,
+                    record_count INTEGER,
+                    synced_at TEXT NOT NULL,
+                    duration_seconds REAL,
+                    status TEXT,
+                    error_message TEXT
+                )
+            """)
+            
+            # get_pending filters on status and orders by age; get_stats and
+            # cleanup_old range-scan the timestamps
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_pending_status_created ON pending_sync(status, created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_pending_created ON pending_sync(created_at)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_history_synced_at ON sync_history(synced_at)")
+            
+            # Agent status
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS agent_status (
+                    key TEXT PRIMARY KEY,
+                    value TEXT,
+                    updated_at TEXT
+                )
+            """)
         
-        conn.commit()
-        conn.close()
         logger.debug("Buffer database initialized")
     
     def add_pending(self, store_id: str, payload: dict, record_count: int) -> str:
-        """Add data to pending sync buffer."""
+        """Add data to pending sync buffer (payload stored as gzipped JSON)."""
+        return self.add_pending_bytes(store_id, encode_json(payload), record_count)
+    
+    def add_pending_bytes(self, store_id: str, body: bytes, record_count: int) -> str:
+        """
+        Add an already-serialized JSON payload to the pending sync buffer.
+        An identical payload that is already pending is not stored twice;
+        the existing ID is returned instead.
+        """
         sync_id = str(uuid.uuid4())
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        payload_hash = hashlib.blake2b(body, digest_size=16).hexdigest()
+        blob = sqlite3.Binary(gzip.compress(body, compresslevel=6))
         
-        cursor.execute("""
-            INSERT INTO pending_sync (id, store_id, payload, record_count, created_at)
-            VALUES (?, ?, ?, ?, ?)
-        """, (sync_id, store_id, json.dumps(payload), record_count, datetime.now().isoformat()))
+        with self._lock:
+            inserted = self.conn.execute("""
+                INSERT OR IGNORE INTO pending_sync (id, store_id, payload, record_count, created_at, payload_hash)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (sync_id, store_id, blob, record_count, datetime.now().isoformat(), payload_hash)).rowcount
+            
+            if not inserted:
+                existing_id = self.conn.execute(
+                    "SELECT id FROM pending_sync WHERE payload_hash = ?", (payload_hash,)
+                ).fetchone()[0]
+        
+        if not inserted:
+            logger.info(f"Duplicate payload already buffered (ID: {existing_id[:8]}...), skipping")
+            return existing_id
         
-        conn.commit()
-        conn.close()
         logger.info(f"Buffered {record_count} records (ID: {sync_id[:8]}...)")
         return sync_id
     
     def get_pending(self, limit: int = 10) -> list:
-        """Get pending sync records ordered by oldest first."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("""
-            SELECT id, store_id, payload, record_count, retry_count
-            FROM pending_sync
-            WHERE status = 'pending'
-            ORDER BY created_at ASC
-            LIMIT ?
-        """, (limit,))
-        
-        results = cursor.fetchall()
-        conn.close()
+        """Get pending sync records ordered by oldest first (payload parsed to a dict)."""
+        loads = orjson.loads if orjson else json.loads
+        pending = self.get_pending_bytes(limit)
+        for item in pending:
+            item["payload"] = loads(item.pop("body"))
+        return pending
+    
+    def get_pending_bytes(self, limit: int = 10) -> list:
+        """Get pending sync records ordered by oldest first, with the raw JSON body."""
+        with self._lock:
+            results = self.conn.execute("""
+                SELECT id, store_id, payload, record_count, retry_count
+                FROM pending_sync
+                WHERE status = 'pending'
+                ORDER BY created_at ASC
+                LIMIT ?
+            """, (limit,)).fetchall()
         
         return [
             {
                 "id": r[0],
                 "store_id": r[1],
-                "payload": json.loads(r[2]),
+                "body": self._decode_body(r[2]),
                 "record_count": r[3],
                 "retry_count": r[4]
             }
             for r in results
         ]
     
+    @staticmethod
+    def _decode_body(value) -> bytes:
+        """Raw JSON of a stored payload; rows buffered by older versions hold plain JSON text."""
+        if isinstance(value, str):
+            return value.encode("utf-8")
+        return gzip.decompress(value)
+    
     def mark_synced(self, sync_id: str, duration: float):
         """Mark a pending record as successfully synced."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        self.mark_synced_many([(sync_id, duration)])
+    
+    def mark_synced_many(self, pairs: list):
+        """
+        Move a batch of synced records from pending to history in one transaction.
+        
+        Args:
+            pairs: List of (sync_id, duration_seconds) tuples
+        """
+        if not pairs:
+            return
         
-        # Get record info for history
-        cursor.execute("SELECT store_id, record_count FROM pending_sync WHERE id = ?", (sync_id,))
-        row = cursor.fetchone()
+        synced_at = datetime.now().isoformat()
         
-        if row:
-            # Add to history
-            cursor.execute("""
+        with self._transaction() as conn:
+            # Copy store/record count into history straight from the pending row
+            conn.executemany("""
                 INSERT INTO sync_history (id, store_id, record_count, synced_at, duration_seconds, status)
-                VALUES (?, ?, ?, ?, ?, 'success')
-            """, (sync_id, row[0], row[1], datetime.now().isoformat(), duration))
+                SELECT id, store_id, record_count, ?, ?, 'success'
+                FROM pending_sync WHERE id = ?
+            """, [(synced_at, duration, sync_id) for sync_id, duration in pairs])
             
-            # Remove from pending
-            cursor.execute("DELETE FROM pending_sync WHERE id = ?", (sync_id,))
-        
-        conn.commit()
-        conn.close()
+            conn.executemany(
+                "DELETE FROM pending_sync WHERE id = ?", [(sync_id,) for sync_id, _ in pairs]
+            )
     
     def mark_failed(self, sync_id: str, error: str):
         """Update retry count and error for failed sync."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        self.mark_failed_many([(sync_id, error)])
+    
+    def mark_failed_many(self, pairs: list):
+        """
+        Bump retry count and store the error for a batch of failed records.
         
-        cursor.execute("""
-            UPDATE pending_sync 
-            SET retry_count = retry_count + 1, last_error = ?
-            WHERE id = ?
-        """, (error, sync_id))
+        Args:
+            pairs: List of (sync_id, error_message) tuples
+        """
+        if not pairs:
+            return
         
-        conn.commit()
-        conn.close()
+        with self._transaction() as conn:
+            conn.executemany("""
+                UPDATE pending_sync 
+                SET retry_count = retry_count + 1, last_error = ?
+                WHERE id = ?
+            """, [(error, sync_id) for sync_id, error in pairs])
     
     def get_stats(self) -> dict:
         """Get buffer statistics."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT COUNT(*), SUM(record_count) FROM pending_sync WHERE status = 'pending'")
-        pending = cursor.fetchone()
-        
-        cursor.execute("""
-            SELECT COUNT(*), SUM(record_count) 
-            FROM sync_history 
-            WHERE synced_at > datetime('now', '-24 hours')
-        """)
-        last_24h = cursor.fetchone()
-        
-        conn.close()
+        with self._lock:
+            pending = self.conn.execute(
+                "SELECT COUNT(*), SUM(record_count) FROM pending_sync WHERE status = 'pending'"
+            ).fetchone()
+            
+            last_24h = self.conn.execute("""
+                SELECT COUNT(*), SUM(record_count) 
+                FROM sync_history 
+                WHERE synced_at > datetime('now', '-24 hours')
+            """).fetchone()
         
         return {
             "pending_batches": pending[0] or 0,
@@ -245,20 +425,36 @@ class SyncBuffer:
     
     def cleanup_old(self, days: int = MAX_BUFFER_AGE_DAYS):
         """Remove old pending and history records."""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        
         cutoff = (datetime.now() - timedelta(days=days)).isoformat()
         
-        cursor.execute("DELETE FROM pending_sync WHERE created_at < ?", (cutoff,))
-        cursor.execute("DELETE FROM sync_history WHERE synced_at < ?", (cutoff,))
-        
-        deleted = cursor.rowcount
-        conn.commit()
-        conn.close()
+        with self._transaction() as conn:
+            deleted = conn.execute("DELETE FROM pending_sync WHERE created_at < ?", (cutoff,)).rowcount
+            deleted += conn.execute("DELETE FROM sync_history WHERE synced_at < ?", (cutoff,)).rowcount
         
         if deleted > 0:
             logger.info(f"Cleaned up {deleted} old records")
+            # Return the freed pages to the filesystem
+            with self._lock:
+                self.conn.execute("PRAGMA incremental_vacuum").fetchall()
+        
+        self._analyze_daily()
+    
+    def _analyze_daily(self):
+        """Refresh query planner statistics at most once a day."""
+        now = datetime.now()
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT value FROM agent_status WHERE key = 'last_analyze'"
+            ).fetchone()
+            if row and now - datetime.fromisoformat(row[0]) < timedelta(days=1):
+                return
+            
+            self.conn.execute("ANALYZE")
+            self.conn.execute("""
+                INSERT OR REPLACE INTO agent_status (key, value, updated_at)
+                VALUES ('last_analyze', ?, ?)
+            """, (now.isoformat(), now.isoformat()))
+        logger.debug("Buffer statistics refreshed (ANALYZE)")
 
 
 # =============================================================================
@@ -273,18 +469,101 @@ class SmartAgent:
     def __init__(self):
         self.config = self._load_config()
         self.buffer = SyncBuffer()
+        
+        # Settings used on every heartbeat, push and chunk, resolved once
+        self.store_id = self.config.get("store_id")
+        self.api_url = self.config.get("central_server_url")
+        self.api_base = self._compute_api_base(self.api_url or "")
+        self.max_retries = self.config.get("retry_attempts", 5)
+        self.base_delay = self.config.get("retry_delay_seconds", 30)
+        self.max_delay = self.config.get("retry_max_delay_seconds", 600)
+        self.chunk_size = self.config.get("chunk_size", 5000)
+        self.interval_minutes = self.config.get("extraction_interval_minutes", 30)
+        self.max_parallel_chunks = max(1, self.config.get("max_parallel_chunks", 3))
+        self.stream_extraction = self.config.get("stream_extraction", False)
+        
+        # One keep-alive client for heartbeats, pushes and pending syncs
+        self.session = self._build_session()
         self.last_heartbeat = None
         self.last_sync = None
         self.sync_errors = 0
+        self.last_error = None
+        self._state_lock = threading.Lock()  # Chunks are pushed from several threads
+        self._db_path = None  # Detected on first extraction, see _get_db_path
+        self._batch_supported = None  # Unknown until the batch sync endpoint is tried
+        self._last_hb_sig = None
+        self._hb_skips = 0
+        
+        # Failed chunks are written to the buffer by a background thread so
+        # the upload loop never waits on SQLite commits
+        self._buffer_writer_q = queue.Queue()
+        self._buffer_writer = threading.Thread(target=self._buffer_writer_loop, daemon=True)
+        self._buffer_writer.start()
+        
+    @staticmethod
+    def _build_session():
+        """
+        HTTP client for the central API. Uses an HTTP/2 httpx client when
+        httpx and h2 are installed, so parallel chunk uploads share one TLS
+        connection; otherwise a pooled requests session.
+        """
+        headers = {
+            "User-Agent": f"AldeloAgent/{AGENT_VERSION}",
+            "Content-Type": "application/json",
+            "Accept-Encoding": "gzip",
+        }
+        
+        if httpx is not None:
+            try:
+                return httpx.Client(
+                    http2=True,
+                    timeout=httpx.Timeout(10.0, read=300.0),
+                    limits=httpx.Limits(max_connections=8, max_keepalive_connections=4),
+                    headers=headers
+                )
+            except ImportError:
+                # httpx without the h2 extra
+                logger.info("HTTP/2 not available, using requests")
         
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=20, max_retries=0)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers.update(headers)
+        session.headers["Connection"] = "keep-alive"
+        return session
+    
+    def _post_body(self, url, body, headers, timeout):
+        """POST already-encoded bytes with either client (httpx takes them as content=)."""
+        if httpx is not None and isinstance(self.session, httpx.Client):
+            return self.session.post(url, content=body, headers=headers, timeout=timeout)
+        return self.session.post(url, data=body, headers=headers, timeout=timeout)
+    
+    def close(self):
+        """Flush queued buffer writes, then release the HTTP session and the buffer connection."""
+        self._buffer_writer_q.put(None)
+        self._buffer_writer.join()
+        self.session.close()
+        self.buffer.close()
+    
+    def _buffer_writer_loop(self):
+        """Persist failed chunks queued by run_extraction_job until a None sentinel arrives."""
+        while True:
+            item = self._buffer_writer_q.get()
+            if item is None:
+                break
+            try:
+                self.buffer.add_pending_bytes(*item)
+            except Exception as e:
+                logger.error(f"Failed to buffer chunk: {e}", exc_info=True)
+    
     def _load_config(self) -> dict:
         """Load configuration from config.json."""
         config_path = Path(__file__).parent / "config.json"
         try:
-            with open(config_path, 'r') as f:
-                config = json.load(f)
-                logger.info("Configuration loaded successfully")
-                return config
+            config = load_config_cached(config_path)
+            logger.info("Configuration loaded successfully")
+            return config
         except FileNotFoundError:
             logger.error(f"config.json not found at {config_path}")
             return {}
@@ -292,9 +571,9 @@ class SmartAgent:
             logger.error(f"Invalid JSON in config.json: {e}")
             return {}
     
-    def _get_api_base(self) -> str:
-        """Get base API URL from config."""
-        url = self.config.get("central_server_url", "")
+    @staticmethod
+    def _compute_api_base(url: str) -> str:
+        """Derive the base API URL from the ingest URL."""
         # Remove /ingest if present to get base URL
         if url.endswith("/ingest"):
             return url[:-7]
@@ -303,24 +582,33 @@ class SmartAgent:
     def send_heartbeat(self):
         """Send heartbeat to central server with agent status."""
         try:
-            base_url = self._get_api_base()
+            base_url = self.api_base
             if not base_url:
                 return
             
             stats = self.buffer.get_stats()
+            status = "healthy" if self.sync_errors < 3 else "degraded"
+            
+            # Skip the POST while nothing has changed, but still send a
+            # keep-alive every HEARTBEAT_MAX_SKIPS + 1 intervals
+            signature = (stats["pending_records"], stats["synced_24h_records"], self.last_sync, status)
+            if signature == self._last_hb_sig and self._hb_skips < HEARTBEAT_MAX_SKIPS:
+                self._hb_skips += 1
+                logger.debug("Heartbeat unchanged, skipping")
+                return
             
             payload = {
-                "store_id": self.config.get("store_id"),
+                "store_id": self.store_id,
                 "agent_version": AGENT_VERSION,
                 "timestamp": datetime.now().isoformat(),
-                "status": "healthy" if self.sync_errors < 3 else "degraded",
+                "status": status,
                 "last_sync": self.last_sync,
                 "pending_records": stats["pending_records"],
                 "synced_24h": stats["synced_24h_records"],
-                "uptime_seconds": int(time.time() - getattr(self, '_start_time', time.time()))
+                "uptime_seconds": int(time.monotonic() - getattr(self, '_start_monotonic', time.monotonic()))
             }
             
-            response = requests.post(
+            response = self.session.post(
                 f"{base_url}/api/agent/heartbeat",
                 json=payload,
                 timeout=10
@@ -328,6 +616,8 @@ class SmartAgent:
             
             if response.status_code == 200:
                 self.last_heartbeat = datetime.now()
+                self._last_hb_sig = signature
+                self._hb_skips = 0
                 logger.debug("Heartbeat sent successfully")
             else:
                 logger.warning(f"Heartbeat failed: HTTP {response.status_code}")
@@ -335,12 +625,25 @@ class SmartAgent:
         except Exception as e:
             logger.warning(f"Heartbeat error: {e}")
     
+    def _get_db_path(self):
+        """
+        Aldelo database path, detected once and then reused. Re-detected
+        only when the cached file has gone missing.
+        """
+        if self._db_path and not os.path.exists(self._db_path):
+            logger.warning(f"Database not found at {self._db_path}, detecting again")
+            self._db_path = None
+        
+        if not self._db_path:
+            self._db_path = get_db_path_with_fallback(self.config)
+        return self._db_path
+    
     def extract_data(self) -> tuple:
         """
         Extract data from Aldelo database.
         Returns: (data_dict, record_count) or (None, 0) on failure
         """
-        db_path = get_db_path_with_fallback(self.config)
+        db_path = self._get_db_path()
         if not db_path:
             logger.error("Database path detection failed")
             return None, 0
@@ -348,145 +651,212 @@ class SmartAgent:
         logger.info(f"Extracting from: {db_path}")
         
         try:
-            data = extract_all_data(db_path, run_date=None, config=self.config)
+            data, total_records = extract_all_data(db_path, run_date=None, config=self.config)
             
             if not data:
                 logger.warning("No data extracted")
                 return None, 0
             
-            total_records = sum(len(v) for v in data.values())
             logger.info(f"Extracted {total_records} records")
             
             return data, total_records
             
+        except FileNotFoundError as e:
+            logger.error(f"Extraction failed: {e}")
+            self._db_path = None
+            return None, 0
         except Exception as e:
             logger.error(f"Extraction failed: {e}", exc_info=True)
             return None, 0
     
-    def push_to_api(self, payload: dict, sync_id: str = None) -> bool:
+    def push_to_api(self, payload) -> bool:
         """
         Push data to central API with exponential backoff.
-        Returns True on success, False on failure.
+        `payload` is a dict or its already-encoded JSON bytes.
+        Returns True on success, False on failure (error kept in self.last_error).
         """
-        api_url = self.config.get("central_server_url")
-        max_retries = self.config.get("retry_attempts", 5)
-        base_delay = self.config.get("retry_delay_seconds", 30)
+        api_url = self.api_url
+        max_retries = self.max_retries
+        
+        start_time = time.monotonic()
         
-        start_time = time.time()
+        # Serialize once; every retry resends the same bytes
+        body, headers = compress_body(payload if isinstance(payload, bytes) else encode_json(payload))
         
         for attempt in range(1, max_retries + 1):
             try:
-                # Exponential backoff: 30s, 60s, 120s, 240s, 480s
-                delay = base_delay * (2 ** (attempt - 1))
-                
                 logger.info(f"API push attempt {attempt}/{max_retries}")
                 
-                response = requests.post(
-                    api_url,
-                    json=payload,
-                    timeout=300
-                )
+                response = self._post_body(api_url, body, headers, timeout=300)
                 
                 if response.status_code == 200:
-                    duration = time.time() - start_time
+                    duration = time.monotonic() - start_time
                     logger.info(f"✓ Successfully pushed data in {duration:.1f}s")
                     
-                    if sync_id:
-                        self.buffer.mark_synced(sync_id, duration)
-                    
-                    self.last_sync = datetime.now().isoformat()
-                    self.sync_errors = 0
+                    with self._state_lock:
+                        self.last_sync = datetime.now().isoformat()
+                        self.sync_errors = 0
                     return True
                 else:
                     error_msg = f"HTTP {response.status_code}: {response.text[:200]}"
                     logger.error(f"API error: {error_msg}")
                     
-            except requests.exceptions.RequestException as e:
+                    # Client errors won't succeed on retry (except timeout / rate limit)
+                    if 400 <= response.status_code < 500 and response.status_code not in (408, 429):
+                        break
+                    
+            except HTTP_ERRORS as e:
                 error_msg = str(e)
                 logger.error(f"Connection error: {error_msg}")
             
             # Wait before retry (not on last attempt)
             if attempt < max_retries:
-                logger.info(f"Retrying in {delay}s...")
+                # Exponential backoff (30s, 60s, 120s... capped) with ±50% jitter
+                # so a fleet of agents doesn't retry in lockstep
+                delay = backoff_delay(attempt - 1, self.base_delay, self.max_delay) * (0.5 + random.random())
+                logger.info(f"Retrying in {delay:.0f}s...")
                 time.sleep(delay)
         
         # All retries failed
-        self.sync_errors += 1
-        if sync_id:
-            self.buffer.mark_failed(sync_id, error_msg)
+        with self._state_lock:
+            self.sync_errors += 1
+            self.last_error = error_msg
         
         return False
     
     def sync_pending(self):
         """Try to sync any pending buffered data."""
-        pending = self.buffer.get_pending(limit=5)
+        # Buffered bodies are sent as stored, without a JSON round-trip
+        pending = self.buffer.get_pending_bytes(limit=5)
         
         if not pending:
             return
         
         logger.info(f"Processing {len(pending)} pending sync batches")
         
+        items = []
         for item in pending:
             # Skip if too many retries
             if item["retry_count"] >= 10:
                 logger.warning(f"Skipping {item['id'][:8]}... (too many retries)")
                 continue
+            items.append(item)
+        
+        if not items:
+            return
+        
+        # One request for all pending batches when the server supports it
+        if self._batch_supported is not False and self._sync_pending_batch(items):
+            return
+        
+        # Collect outcomes and write them back in one transaction each
+        synced = []
+        failed = []
+        
+        for item in items:
+            start_time = time.monotonic()
+            success = self.push_to_api(item["body"])
             
-            success = self.push_to_api(item["payload"], sync_id=item["id"])
-            
-            if not success:
+            if success:
+                synced.append((item["id"], time.monotonic() - start_time))
+            else:
+                failed.append((item["id"], self.last_error))
                 # Stop trying pending items if API is down
                 logger.warning("API unreachable, stopping pending sync")
                 break
+        
+        self.buffer.mark_synced_many(synced)
+        self.buffer.mark_failed_many(failed)
     
-    def _chunk_data(self, data: dict, chunk_size: int = 5000) -> list:
+    def _sync_pending_batch(self, items: list) -> bool:
         """
-        Split large data into smaller chunks to avoid server timeouts.
-        Returns list of (chunk_data, chunk_count) tuples.
+        Send all pending batches in one POST to /api/agent/sync/batch.
+        
+        The server answers with {"results": [{"sync_id": ..., "success": bool,
+        "error": str}]}. Returns False (and remembers it) if the endpoint
+        doesn't exist, so the caller falls back to one push per batch.
         """
-        orderheaders = data.get('orderheaders', [])
-        orderpayments = data.get('orderpayments', [])
-        invoices = data.get('accountinvoiceerp', [])
-        
-        # If data is small enough, return as single chunk
-        total = len(orderheaders) + len(orderpayments) + len(invoices)
-        if total <= chunk_size:
-            return [(data, total)]
-        
-        chunks = []
-        
-        # Chunk orderheaders (main data)
-        for i in range(0, len(orderheaders), chunk_size):
-            chunk_orders = orderheaders[i:i + chunk_size]
-            chunk_data = {
-                'orderheaders': chunk_orders,
-                'orderpayments': [],  # Will be handled separately
-                'accountinvoiceerp': []
-            }
-            chunks.append((chunk_data, len(chunk_orders)))
-        
-        # Chunk orderpayments
-        for i in range(0, len(orderpayments), chunk_size):
-            chunk_payments = orderpayments[i:i + chunk_size]
-            chunk_data = {
-                'orderheaders': [],
-                'orderpayments': chunk_payments,
-                'accountinvoiceerp': []
-            }
-            chunks.append((chunk_data, len(chunk_payments)))
-        
-        # Chunk invoices
-        for i in range(0, len(invoices), chunk_size):
-            chunk_invoices = invoices[i:i + chunk_size]
-            chunk_data = {
-                'orderheaders': [],
-                'orderpayments': [],
-                'accountinvoiceerp': chunk_invoices
-            }
-            chunks.append((chunk_data, len(chunk_invoices)))
+        url = f"{self.api_base}/api/agent/sync/batch"
+        
+        # Stored bodies are spliced in as-is (no re-parsing)
+        entries = [
+            b'{"sync_id":' + encode_json(item["id"])
+            + b',"chunk_count":' + str(item["record_count"] or 0).encode("ascii")
+            + b',"payload":' + item["body"] + b'}'
+            for item in items
+        ]
+        raw = b'{"store_id":' + encode_json(self.store_id) + b',"batches":[' + b','.join(entries) + b']}'
+        body, headers = compress_body(raw)
+        
+        start_time = time.monotonic()
+        try:
+            response = self._post_body(url, body, headers, timeout=300)
+        except HTTP_ERRORS as e:
+            logger.error(f"Batch sync connection error: {e}")
+            self.buffer.mark_failed_many([(item["id"], str(e)) for item in items])
+            return True
+        
+        if response.status_code == 404:
+            logger.info("Batch sync endpoint not available, syncing pending batches one by one")
+            self._batch_supported = False
+            return False
+        
+        if response.status_code != 200:
+            error_msg = f"HTTP {response.status_code}: {response.text[:200]}"
+            logger.error(f"Batch sync error: {error_msg}")
+            self.buffer.mark_failed_many([(item["id"], error_msg) for item in items])
+            return True
+        
+        self._batch_supported = True
+        duration = time.monotonic() - start_time
+        try:
+            statuses = {r.get("sync_id"): r for r in response.json().get("results", [])}
+        except ValueError:
+            statuses = {}
+        
+        synced = []
+        failed = []
+        for item in items:
+            status = statuses.get(item["id"])
+            if status and status.get("success"):
+                synced.append((item["id"], duration))
+            else:
+                failed.append((item["id"], (status or {}).get("error") or "No status returned"))
         
-        logger.info(f"Split {total} records into {len(chunks)} chunks of max {chunk_size}")
-        return chunks
+        self.buffer.mark_synced_many(synced)
+        self.buffer.mark_failed_many(failed)
+        
+        if synced:
+            self.last_sync = datetime.now().isoformat()
+        logger.info(f"Batch sync: {len(synced)} synced, {len(failed)} failed in {duration:.1f}s")
+        return True
+    
+    def _chunk_data(self, data: dict, total_records: int, chunk_size: int = 5000) -> tuple:
+        """
+        Plan how an extraction is split to avoid server timeouts.
+        `total_records` is the count extract_data already computed, so the
+        lists are not summed again.
+        Returns (chunks, total_chunks): a lazy iterator of
+        (chunk_data, chunk_count) tuples and how many it will yield.
+        """
+        # If data is small enough, send it as a single chunk
+        if total_records <= chunk_size:
+            return iter([(data, total_records)]), 1
+        
+        total_chunks = sum(-(-len(data.get(kind, _EMPTY)) // chunk_size) for kind in CHUNK_KINDS)
+        return self._iter_chunks(data, chunk_size), total_chunks
+    
+    def _iter_chunks(self, data: dict, chunk_size: int):
+        """
+        Lazily split data into chunks of one list each. Only one chunk's
+        slice is alive at a time, and the unused keys share one empty sentinel.
+        """
+        for kind in CHUNK_KINDS:
+            rows = data.get(kind, _EMPTY)
+            others = {other: _EMPTY for other in CHUNK_KINDS if other != kind}
+            for i in range(0, len(rows), chunk_size):
+                chunk_rows = rows[i:i + chunk_size]
+                yield {kind: chunk_rows, **others}, len(chunk_rows)
 
     def run_extraction_job(self):
         """Main extraction and sync job with chunking for large datasets."""
@@ -504,65 +874,149 @@ class SmartAgent:
             return
         
         # 3. Chunk data if too large
-        chunks = self._chunk_data(data, chunk_size=5000)
+        chunks, total_chunks = self._chunk_data(data, record_count, chunk_size=self.chunk_size)
+        if total_chunks > 1:
+            logger.info(f"Split {record_count} records into {total_chunks} chunks of max {self.chunk_size}")
         
+        success_count, failed_count = self._push_chunks(chunks, total_chunks)
+        
+        logger.info(f"Extraction complete: {success_count} synced, {failed_count} buffered")
+        logger.info("Extraction job complete")
+    
+    def run_extraction_job_streaming(self):
+        """
+        Extraction job that posts each batch as soon as it is read, so only
+        a few batches are held in memory instead of the whole extraction.
+        The total chunk count is not known up front and is sent as None.
+        """
+        logger.info("=" * 60)
+        logger.info("Starting streaming extraction job")
+        
+        self.sync_pending()
+        
+        db_path = self._get_db_path()
+        if not db_path:
+            logger.error("Database path detection failed")
+            return
+        
+        logger.info(f"Extracting from: {db_path}")
+        
+        batches = extract_all_data_iter(db_path, config=self.config, batch_size=self.chunk_size)
+        chunks = (
+            ({kind: rows if kind == table else _EMPTY for kind in CHUNK_KINDS}, len(rows))
+            for table, rows in batches
+        )
+        
+        try:
+            success_count, failed_count = self._push_chunks(chunks, None)
+        except FileNotFoundError as e:
+            logger.error(f"Extraction failed: {e}")
+            self._db_path = None
+            return
+        except Exception as e:
+            logger.error(f"Extraction failed: {e}", exc_info=True)
+            return
+        
+        if success_count + failed_count == 0:
+            logger.info("No new data to sync")
+            return
+        
+        logger.info(f"Extraction complete: {success_count} synced, {failed_count} buffered")
+        logger.info("Extraction job complete")
+    
+    def _push_chunks(self, chunks, total_chunks) -> tuple:
+        """
+        Push (chunk_data, chunk_count) tuples to the API, up to
+        max_parallel_chunks at a time. Failed chunks are queued for the
+        buffer writer. Returns (success_count, failed_count) in records.
+        """
         success_count = 0
         failed_count = 0
         
-        for idx, (chunk_data, chunk_count) in enumerate(chunks):
-            logger.info(f"Processing chunk {idx + 1}/{len(chunks)} ({chunk_count} records)")
+        # Same for every chunk: they all belong to this one extraction
+        store_id = self.store_id
+        extraction_time = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        
+        def push_chunk(idx, chunk_data, chunk_count):
+            logger.info(f"Processing chunk {idx + 1}/{total_chunks or '?'} ({chunk_count} records)")
             
             # Build payload for this chunk
             payload = {
-                "store_id": self.config.get("store_id"),
+                "store_id": store_id,
                 "data": chunk_data,
-                "extraction_time": datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                "extraction_time": extraction_time,
                 "agent_version": AGENT_VERSION,
                 "chunk_info": {
                     "chunk_number": idx + 1,
-                    "total_chunks": len(chunks),
+                    "total_chunks": total_chunks,
                     "chunk_records": chunk_count
                 }
             }
             
-            # Try to push this chunk
-            success = self.push_to_api(payload)
-            
-            if success:
-                success_count += chunk_count
-            else:
-                failed_count += chunk_count
-                # Buffer failed chunk for later
-                self.buffer.add_pending(
-                    self.config.get("store_id"),
-                    payload,
-                    chunk_count
-                )
-                logger.warning(f"Chunk {idx + 1} buffered for later sync")
+            # Encoded once, reused if it has to be buffered
+            body = encode_json(payload)
+            return idx, chunk_count, body, self.push_to_api(body)
         
-        logger.info(f"Extraction complete: {success_count} synced, {failed_count} buffered")
-        logger.info("Extraction job complete")
+        def collect(done):
+            nonlocal success_count, failed_count
+            for future in done:
+                idx, chunk_count, body, success = future.result()
+                if success:
+                    success_count += chunk_count
+                else:
+                    failed_count += chunk_count
+                    # Buffer failed chunk for later (written by the background writer)
+                    self._buffer_writer_q.put((store_id, body, chunk_count))
+                    logger.warning(f"Chunk {idx + 1} queued for buffering and later sync")
+        
+        # Upload up to max_parallel_chunks chunks at once over the shared session.
+        # Only that many are in flight, so chunks are still built lazily.
+        in_flight = set()
+        with ThreadPoolExecutor(max_workers=self.max_parallel_chunks) as executor:
+            chunk_iter = enumerate(chunks)
+            try:
+                while True:
+                    for idx, (chunk_data, chunk_count) in chunk_iter:
+                        in_flight.add(executor.submit(push_chunk, idx, chunk_data, chunk_count))
+                        if len(in_flight) >= self.max_parallel_chunks:
+                            break
+                    
+                    if not in_flight:
+                        break
+                    
+                    done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(done)
+            finally:
+                # If building a chunk (or a push) raised, uploads already in
+                # flight still finish and any that failed are still buffered
+                for future in in_flight:
+                    try:
+                        collect([future])
+                    except Exception as e:
+                        logger.error(f"Chunk upload failed: {e}")
+        
+        return success_count, failed_count
     
     def run(self):
         """Main agent loop."""
-        self._start_time = time.time()
+        self._start_monotonic = time.monotonic()
         
         logger.info("=" * 60)
         logger.info(f"Smart Agent v{AGENT_VERSION} Started")
-        logger.info(f"Store ID: {self.config.get('store_id')}")
+        logger.info(f"Store ID: {self.store_id}")
         logger.info("=" * 60)
         
-        # Get interval from config
-        interval = self.config.get("extraction_interval_minutes", 30)
+        interval = self.interval_minutes
         
         # Schedule jobs
-        schedule.every(interval).minutes.do(self.run_extraction_job)
+        extraction_job = self.run_extraction_job_streaming if self.stream_extraction else self.run_extraction_job
+        schedule.every(interval).minutes.do(extraction_job)
         schedule.every(HEARTBEAT_INTERVAL_MINUTES).minutes.do(self.send_heartbeat)
         schedule.every(1).days.do(self.buffer.cleanup_old)
         
         # Run initial jobs
         logger.info("Running initial extraction...")
-        self.run_extraction_job()
+        extraction_job()
         self.send_heartbeat()
         
         # Main loop
@@ -570,7 +1024,10 @@ class SmartAgent:
         
         while True:
             schedule.run_pending()
-            time.sleep(1)
+            # Sleep until the next job is due instead of polling every second;
+            # capped at 60s so Ctrl+C and schedule changes are still picked up
+            idle = schedule.idle_seconds()
+            time.sleep(max(1, min(idle if idle is not None else 60, 60)))
 
 
 # =============================================================================
@@ -578,6 +1035,7 @@ class SmartAgent:
 # =============================================================================
 
 if __name__ == "__main__":
+    agent = None
     try:
         agent = SmartAgent()
         agent.run()
@@ -586,3 +1044,6 @@ if __name__ == "__main__":
     except Exception as e:
         logger.error(f"Agent crashed: {e}", exc_info=True)
         raise
+    finally:
+        if agent is not None:
+            agent.close()
@@ -5,12 +5,11 @@ This script allows you to test the extraction functionality before
 installing as a service.
 
 Usage:
-    python test_extraction.py
+    python test_extraction.py [YYYY-MM-DD | yesterday] [--csv orderheaders.csv]
 """
 
 import sys
 import os
-import json
 from datetime import datetime, timedelta
 from pprint import pprint
 
@@ -18,8 +17,9 @@ from pprint import pprint
 sys.path.insert(0, os.path.dirname(__file__))
 
 from utils.registry_reader import get_aldelo_db_path, get_db_path_with_fallback
-from utils.db_connector import get_connection, test_connection
-from tools.access_db import extract_all_data
+from utils.config_loader import load_config_cached
+from utils.test_helpers import open_aldelo
+from tools.access_db import extract_all_data, extract_orderheaders_to_csv
 
 
 def print_section(title):
@@ -29,13 +29,87 @@ def print_section(title):
     print("="*60)
 
 
+def run_extraction_test(conn, db_path, run_date, config):
+    """Extract with the already open connection. Returns True on success."""
+    # 4. Test extraction
+    print_section("Data Extraction Test")
+    print("Extracting data from Aldelo tables...")
+    
+    try:
+        data, total_records = extract_all_data(db_path, run_date=run_date, config=config, conn=conn)
+        
+        if not data:
+            print("✗ Extraction failed or returned no data")
+            return False
+        
+        print("\n✓ Extraction successful!")
+        print("\nRecords found:")
+        print(f"  - Orderheaders:      {len(data['orderheaders']):4d} records")
+        print(f"  - Orderpayments:     {len(data['orderpayments']):4d} records")
+        print(f"  - AccountInvoiceERP: {len(data['account_invoice_erp']):4d} records")
+        print(f"  - Total:             {total_records:4d} records")
+        
+        # Show sample data
+        if data['orderheaders']:
+            print("\nSample Orderheader:")
+            pprint(data['orderheaders'][0], indent=2)
+        
+        if data['orderpayments']:
+            print("\nSample Orderpayment:")
+            pprint(data['orderpayments'][0], indent=2)
+        
+        if data['account_invoice_erp']:
+            print("\nSample Account Invoice:")
+            pprint(data['account_invoice_erp'][0], indent=2)
+        
+    except Exception as e:
+        print(f"✗ Extraction failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+    
+    return True
+
+
+def run_csv_export_test(conn, run_date, out_path):
+    """Export the day's orderheaders to out_path and check the file. Returns True on success."""
+    print_section("Orderheaders CSV Export Test")
+    day = run_date or datetime.now().strftime('%Y-%m-%d')
+    print(f"Exporting orderheaders for {day} to {out_path}...")
+    
+    try:
+        out_path = extract_orderheaders_to_csv(conn, day, day, out_path)
+        with open(out_path, 'r', encoding='utf-8', errors='replace') as f:
+            header = f.readline().strip()
+            rows = sum(1 for line in f if line.strip())
+    except Exception as e:
+        print(f"✗ CSV export failed: {e}")
+        return False
+    
+    if not header:
+        print(f"✗ {out_path} has no header row")
+        return False
+    
+    print(f"✓ Wrote {rows} rows to {out_path}")
+    print(f"  Header: {header}")
+    return True
+
+
 def main():
     print_section("Aldelo Database Extraction Test")
     
+    # Optional --csv output path for the export test
+    args = sys.argv[1:]
+    csv_path = None
+    if "--csv" in args:
+        i = args.index("--csv")
+        csv_path = args[i + 1] if i + 1 < len(args) else "orderheaders.csv"
+        del args[i:i + 2]
+    
     # Optional date argument
     run_date = None
-    if len(sys.argv) > 1:
-        date_arg = sys.argv[1]
+    if args:
+        date_arg = args[0]
         if date_arg.lower() == 'yesterday':
             run_date = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
         else:
@@ -45,8 +119,7 @@ def main():
     # 1. Load config
     print("\n1. Loading configuration...")
     try:
-        with open('config.json', 'r') as f:
-            config = json.load(f)
+        config = load_config_cached(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'config.json'))
         print("✓ Configuration loaded")
         pprint(config, indent=2)
     except Exception as e:
@@ -68,61 +141,26 @@ def main():
     
     print(f"✓ Database found: {db_path}")
     
-    # 3. Test connection
+    # 3. Test connection (kept open for the extraction test)
     print_section("Database Connection Test")
     print("Testing connection strategies...")
     
-    result = test_connection(db_path, strategy="auto")
-    pprint(result, indent=2)
-    
-    if not result["success"]:
+    try:
+        with open_aldelo(config, db_path, strategy="auto") as (conn, db_path):
+            print("\n✓ Connection successful")
+            if not run_extraction_test(conn, db_path, run_date, config):
+                return
+            if csv_path and not run_csv_export_test(conn, run_date, csv_path):
+                return
+    except Exception as e:
         print("\n✗ Connection failed")
-        print(f"Error: {result['error']}")
+        print(f"Error: {e}")
         print("\nTroubleshooting:")
         print("- Is Microsoft Access Database Engine installed?")
         print("- Download from: https://www.microsoft.com/en-us/download/details.aspx?id=54920")
         print("- Check if database file is accessible")
         return
     
-    print("\n✓ Connection successful")
-    
-    # 4. Test extraction
-    print_section("Data Extraction Test")
-    print("Extracting data from Aldelo tables...")
-    
-    try:
-        data = extract_all_data(db_path, run_date=run_date, config=config)
-        
-        if not data:
-            print("✗ Extraction failed or returned no data")
-            return
-        
-        print("\n✓ Extraction successful!")
-        print("\nRecords found:")
-        print(f"  - Orderheaders:      {len(data['orderheaders']):4d} records")
-        print(f"  - Orderpayments:     {len(data['orderpayments']):4d} records")
-        print(f"  - AccountInvoiceERP: {len(data['account_invoice_erp']):4d} records")
-        print(f"  - Total:             {sum(len(v) for v in data.values()):4d} records")
-        
-        # Show sample data
-        if data['orderheaders']:
-            print("\nSample Orderheader:")
-            pprint(data['orderheaders'][0], indent=2)
-        
-        if data['orderpayments']:
-            print("\nSample Orderpayment:")
-            pprint(data['orderpayments'][0], indent=2)
-        
-        if data['account_invoice_erp']:
-            print("\nSample Account Invoice:")
-            pprint(data['account_invoice_erp'][0], indent=2)
-        
-    except Exception as e:
-        print(f"✗ Extraction failed: {e}")
-        import traceback
-        traceback.print_exc()
-        return
-    
     # 5. Summary
     print_section("Test Summary")
     print("✓ All tests passed!")
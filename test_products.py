@@ -4,7 +4,6 @@ Shows EXACT column names and sample data for product-related tables.
 """
 import os
 import sys
-import json
 import logging
 
 logging.basicConfig(level=logging.INFO, format='%(message)s')
@@ -12,64 +11,72 @@ logging.basicConfig(level=logging.INFO, format='%(message)s')
 script_dir = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, script_dir)
 
-from utils.db_connector import get_connection
-from utils.registry_reader import get_db_path_with_fallback
+from utils.config_loader import load_config_cached
+from utils.test_helpers import open_aldelo
 
 def analyze_table(cursor, table_name, limit=3):
-    """Analyze a single table - show all columns and sample data."""
+    """Analyze a single table - show all columns and sample data (one query)."""
     print(f"\n{'='*70}")
     print(f"TABLE: {table_name}")
     print('='*70)
     
     try:
-        cursor.execute(f"SELECT TOP 1 * FROM [{table_name}]")
+        # Column names come from the sample query's description,
+        # so no separate schema query is needed
+        cursor.execute(f"SELECT TOP {limit} * FROM [{table_name}]")
+        cols = [d[0] for d in cursor.description or []]
         
-        if cursor.recordset:
-            rs = cursor.recordset
-            cols = []
-            print(f"\nCOLUMNS ({rs.Fields.Count}):")
-            for i in range(rs.Fields.Count):
-                col = rs.Fields(i).Name
-                cols.append(col)
-                print(f"  {i+1:2}. {col}")
-            
-            # Get count
-            cursor.execute(f"SELECT COUNT(*) FROM [{table_name}]")
-            if cursor.recordset and not cursor.recordset.EOF:
-                count = cursor.recordset.Fields(0).Value
-                print(f"\nTOTAL ROWS: {count:,}")
-            
-            # Get sample data
-            cursor.execute(f"SELECT TOP {limit} * FROM [{table_name}]")
-            rows = cursor.fetchall()
-            if rows:
-                print(f"\nSAMPLE DATA ({len(rows)} rows):")
-                for i, row in enumerate(rows):
-                    print(f"\n  Row {i+1}:")
-                    for j, val in enumerate(row):
-                        if j < len(cols):
-                            val_str = str(val)[:50] if val is not None else 'NULL'
-                            print(f"    {cols[j]}: {val_str}")
-            
-            return cols
+        print(f"\nCOLUMNS ({len(cols)}):")
+        for i, col in enumerate(cols):
+            print(f"  {i+1:2}. {col}")
+        
+        rows = cursor.fetchall()
+        if rows:
+            print(f"\nSAMPLE DATA ({len(rows)} rows):")
+            for i, row in enumerate(rows):
+                print(f"\n  Row {i+1}:")
+                for j, val in enumerate(row):
+                    if j < len(cols):
+                        val_str = str(val)[:50] if val is not None else 'NULL'
+                        print(f"    {cols[j]}: {val_str}")
+        
+        return cols
     except Exception as e:
         print(f"ERROR: {e}")
         return []
 
+def print_row_counts(cursor, tables):
+    """Print the row count of every table with a single UNION ALL query."""
+    if not tables:
+        return
+    sql = " UNION ALL ".join(
+        f"SELECT '{table}' AS table_name, COUNT(*) AS cnt FROM [{table}]" for table in tables
+    )
+    try:
+        cursor.execute(sql)
+        for table_name, count in cursor.fetchall():
+            print(f"  {table_name}: {count:,} rows")
+    except Exception as e:
+        print(f"COUNT ERROR: {e}")
+
 def main():
     """Main analysis function."""
-    config_path = os.path.join(script_dir, 'config.json')
-    with open(config_path, 'r') as f:
-        config = json.load(f)
+    config = load_config_cached(os.path.join(script_dir, 'config.json'))
     
-    db_path = get_db_path_with_fallback(config)
+    with open_aldelo(config) as (conn, db_path):
+        analyze(conn, db_path)
     
+    print("\n" + "="*70)
+    print("  ANALYSIS COMPLETE - Copy this output and share it!")
+    print("="*70)
+
+def analyze(conn, db_path):
+    """Run every analysis on one open connection."""
     print("\n" + "="*70)
     print("  ALDELO COMPLETE SCHEMA ANALYZER")
     print("="*70)
     print(f"Database: {db_path}\n")
     
-    conn = get_connection(db_path, strategy="oledb", read_only=True)
     cursor = conn.cursor()
     
     # Analyze key tables for products
@@ -85,6 +92,12 @@ def main():
         cols = analyze_table(cursor, table)
         all_columns[table] = cols
     
+    # Row counts for all tables in one round-trip
+    print("\n" + "="*70)
+    print("  TOTAL ROWS")
+    print("="*70)
+    print_row_counts(cursor, [table for table in tables if all_columns[table]])
+    
     # Summary
     print("\n" + "="*70)
     print("  SUMMARY - KEY COLUMNS FOR EXTRACTION")
@@ -125,11 +138,6 @@ def main():
             print(f"  OrderID={row[0]}, MenuItemID={row[1]}, Qty={row[2]}, Price={row[3]}, Name={row[4]}")
     except Exception as e:
         print(f"JOIN ERROR: {e}")
-    
-    conn.close()
-    print("\n" + "="*70)
-    print("  ANALYSIS COMPLETE - Copy this output and share it!")
-    print("="*70)
 
 if __name__ == "__main__":
     main()
@@ -9,14 +9,19 @@ Extracts data from Aldelo For Restaurants specific tables:
 Uses cursor-based approach to avoid pandas datetime parsing issues.
 """
 
+import os
+import csv
 import logging
+from operator import itemgetter
+from decimal import Decimal
 from datetime import datetime, timedelta
-from utils.db_connector import get_connection, DatabaseConnectionError
+from concurrent.futures import ThreadPoolExecutor
+from utils.db_connector import ConnectionHolder, DatabaseConnectionError, get_connection, init_com_thread
 
 logger = logging.getLogger("WindowsAgent.DataExtraction")
 
 
-def extract_all_data(db_path, run_date=None, config=None):
+def extract_all_data(db_path, run_date=None, config=None, conn=None):
     """
     Extract data from all Aldelo tables for a date range.
     
@@ -25,9 +30,20 @@ def extract_all_data(db_path, run_date=None, config=None):
         run_date: Specific date to extract (YYYY-MM-DD format), or None for range
         config: Configuration dict with connection settings
                 - lookback_days: Number of past days to extract (default: 30)
+                - parallel_extract: Read invoices and the other tables on two
+                  connections at once (default: False)
+        conn: Optional open connection to reuse. It is left open for the
+              caller; when omitted the connection kept by ConnectionHolder
+              is used (opened on first use, reused by later calls).
         
     Returns:
-        dict: Dictionary with keys 'orderheaders', 'orderpayments', 'account_invoice_erp'
+        tuple: (data, total_records) where data is a dict with keys 'orderheaders',
+               'orderpayments', 'account_invoice_erp', 'orderdetails'.
+               (None, 0) on failure.
+    
+    Raises:
+        FileNotFoundError: If the database file no longer exists, so callers
+                           can detect the path again
     """
     # Determine date range
     lookback_days = config.get("lookback_days", 30) if config else 30
@@ -48,17 +64,14 @@ def extract_all_data(db_path, run_date=None, config=None):
     strategy = config.get("connection_strategy", ["oledb", "odbc"])[0] if config else "auto"
     
     try:
-        conn = get_connection(db_path, strategy=strategy, read_only=read_only)
-        
-        # Extract from all four tables with date range
-        data = {
-            "orderheaders": extract_orderheaders(conn, start_date, end_date),
-            "orderpayments": extract_orderpayments(conn, start_date, end_date),
-            "account_invoice_erp": extract_account_invoice_erp(conn, start_date, end_date),
-            "orderdetails": extract_orderdetails(conn, start_date, end_date)
-        }
-        
-        conn.close()
+        if conn is None and config and config.get("parallel_extract", False):
+            data = _extract_tables_parallel(db_path, strategy, read_only, start_date, end_date)
+        elif conn is None:
+            # Reuses the connection held from the previous run when still open
+            with ConnectionHolder.get(db_path, strategy, read_only).acquire() as conn:
+                data = _extract_tables(conn, start_date, end_date)
+        else:
+            data = _extract_tables(conn, start_date, end_date)
         
         # Log summary
         total_records = sum(len(v) for v in data.values())
@@ -68,20 +81,73 @@ def extract_all_data(db_path, run_date=None, config=None):
         logger.info(f"  - AccountInvoiceERP: {len(data['account_invoice_erp'])}")
         logger.info(f"  - Orderdetails: {len(data['orderdetails'])}")
         
-        return data
+        return data, total_records
         
+    except FileNotFoundError:
+        raise
     except DatabaseConnectionError as e:
         logger.error(f"Database connection failed: {e}")
-        return None
+        return None, 0
     except Exception as e:
         logger.error(f"Data extraction failed: {e}")
-        return None
+        return None, 0
+
+
+def _extract_tables(conn, start_date, end_date):
+    """Read all four tables for the date range on an open connection."""
+    # Headers, payments and details come back from one UNION ALL
+    # statement instead of three queries that each re-filter Orderheaders
+    data = {
+        "orderheaders": [],
+        "orderpayments": [],
+        "account_invoice_erp": extract_account_invoice_erp(conn, start_date, end_date),
+        "orderdetails": []
+    }
+    for bundle in iter_month_bundle(conn, start_date, end_date):
+        for table, records in bundle.items():
+            data[table].extend(records)
+    return data
+
+
+def _extract_tables_parallel(db_path, strategy, read_only, start_date, end_date):
+    """
+    _extract_tables with the invoice query and the headers/payments/details
+    bundle running at the same time, each on its own connection and thread
+    (ACE connections can't be shared across threads). COM calls wait
+    outside the GIL, so the two provider round-trips overlap.
+    """
+    def run(read):
+        conn = get_connection(db_path, strategy=strategy, read_only=read_only)
+        try:
+            return read(conn)
+        finally:
+            conn.close()
+    
+    def read_bundle(conn):
+        tables = {"orderheaders": [], "orderpayments": [], "orderdetails": []}
+        for bundle in iter_month_bundle(conn, start_date, end_date):
+            for table, records in bundle.items():
+                tables[table].extend(records)
+        return tables
+    
+    with ThreadPoolExecutor(max_workers=2, initializer=init_com_thread) as executor:
+        invoices_future = executor.submit(run, lambda conn: extract_account_invoice_erp(conn, start_date, end_date))
+        tables_future = executor.submit(run, read_bundle)
+        tables = tables_future.result()
+        return {
+            "orderheaders": tables["orderheaders"],
+            "orderpayments": tables["orderpayments"],
+            "account_invoice_erp": invoices_future.result(),
+            "orderdetails": tables["orderdetails"]
+        }
 
 
 def safe_str(value):
     """Safely convert value to string, handling None."""
     if value is None:
         return ''
+    if type(value) is str:
+        return value
     return str(value)
 
 
@@ -89,6 +155,8 @@ def safe_float(value):
     """Safely convert value to float, handling None."""
     if value is None:
         return 0.0
+    if type(value) is float:
+        return value
     try:
         return float(value)
     except:
@@ -96,15 +164,113 @@ def safe_float(value):
 
 
 def safe_datetime(value):
-    """Safely convert datetime to ISO string."""
+    """Safely convert datetime to ISO string ('YYYY-MM-DD HH:MM:SS', same as str())."""
     if value is None:
         return None
+    if isinstance(value, datetime):
+        return value.isoformat(' ')
     try:
         return str(value)
     except:
         return None
 
 
+def _datetime_parts(value):
+    """
+    (safe_datetime(value), time part) for a DB datetime. The time is taken
+    from the datetime object itself rather than by splitting the string.
+    """
+    if isinstance(value, datetime):
+        return value.isoformat(' '), value.timetz().isoformat()
+    value = safe_datetime(value)
+    return value, value.split(' ')[-1] if value and ' ' in value else None
+
+
+def _iter_rows(cursor, size=1000):
+    """
+    Yield result rows `size` at a time via fetchmany, so only one batch of
+    raw rows is held alongside the records built from them.
+    """
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            return
+        yield from rows
+
+
+def _orderheader_record(row):
+    """Map an Orderheaders row (OrderID .. StationID) to an API record."""
+    (order_id, order_dt, table_id, employee_id, amount_due, subtotal, tax, discount,
+     surcharge, gratuity, status, order_type, station_id) = row
+    order_dt, time_str = _datetime_parts(order_dt)
+
+    return {
+        "order_id": safe_str(order_id),
+        "order_date": order_dt,
+        "order_time": time_str,
+        "table_number": safe_str(table_id),
+        "server_id": safe_str(employee_id),
+        "server_name": "Aldelo Server",
+        "customer_name": "Customer", 
+        "grand_total": safe_float(amount_due),
+        "subtotal": safe_float(subtotal),
+        "tax_amount": safe_float(tax),
+        "discount_amount": safe_float(discount),
+        "service_charge": safe_float(surcharge),
+        "tip_amount": safe_float(gratuity),
+        "order_status": safe_str(status),
+        "order_type": safe_str(order_type),
+        "terminal_id": safe_str(station_id)
+    }
+
+
+def _orderpayment_record(row):
+    """Map an Orderpayments row (OrderID .. PaymentDateTime) to an API record."""
+    order_id, payment_id, method, paid, tendered, card_type, card_last4, payment_dt = row
+    payment_dt, time_str = _datetime_parts(payment_dt)
+    
+    amount_paid = safe_float(paid)
+    amount_tendered = safe_float(tendered)
+
+    return {
+        "order_id": safe_str(order_id),
+        "payment_id": safe_str(payment_id),
+        "payment_type": safe_str(method),
+        "payment_amount": amount_paid,
+        "tender_amount": amount_tendered,
+        "change_amount": amount_tendered - amount_paid,
+        "card_type": safe_str(card_type),
+        "card_number": safe_str(card_last4),
+        "payment_date": payment_dt,
+        "payment_time": time_str
+    }
+
+
+def _orderdetail_record(row):
+    """Map an OrderTransactions row (OrderID, item, qty, price, category) to an API record."""
+    order_id, item, quantity, price, category = row
+    return {
+        "order_id": safe_str(order_id),
+        "item_name": safe_str(item) if item else "Producto sin nombre",
+        "quantity": safe_float(quantity),
+        "price": safe_float(price),
+        "category": safe_str(category) if category else "Sin categoría"
+    }
+
+
+def _account_invoice_record(row):
+    """Build an account_invoice_erp record from an AccountInvoiceERP row."""
+    invoice_id, invoice_number, delivered, customer_id, total = row
+    return {
+        "invoice_id": safe_str(invoice_id),
+        "invoice_number": safe_str(invoice_number),
+        "invoice_date": safe_datetime(delivered),
+        "account_id": safe_str(customer_id),
+        "account_name": "Customer",
+        "total_amount": safe_float(total),
+    }
+
+
 def extract_orderheaders(conn, start_date, end_date=None):
     """
     Extract from Orderheaders table with date range support.
@@ -113,7 +279,10 @@ def extract_orderheaders(conn, start_date, end_date=None):
     if not end_date:
         end_date = start_date
     
-    sql = f"""
+    # Half-open range on the raw column so ACE can seek an index on it.
+    # Bound as parameters, so the statement text is the same on every call.
+    start, end = _day_range(start_date, end_date)
+    sql = """
     SELECT 
         OrderID,
         OrderDateTime,
@@ -129,41 +298,14 @@ def extract_orderheaders(conn, start_date, end_date=None):
         OrderType,
         StationID
     FROM Orderheaders
-    WHERE OrderDateTime IS NOT NULL
-      AND FORMAT(OrderDateTime, 'yyyy-mm-dd') >= '{start_date}'
-      AND FORMAT(OrderDateTime, 'yyyy-mm-dd') <= '{end_date}'
+    WHERE OrderDateTime >= ? AND OrderDateTime < ?
     ORDER BY OrderDateTime DESC
     """
     
     try:
         cursor = conn.cursor()
-        cursor.execute(sql)
-        rows = cursor.fetchall()
-        
-        records = []
-        for row in rows:
-            order_dt = safe_datetime(row[1])
-            time_str = order_dt.split(' ')[-1] if order_dt and ' ' in order_dt else None
-
-            record = {
-                "order_id": safe_str(row[0]),
-                "order_date": order_dt,
-                "order_time": time_str,
-                "table_number": safe_str(row[2]),
-                "server_id": safe_str(row[3]),
-                "server_name": "Aldelo Server",
-                "customer_name": "Customer", 
-                "grand_total": safe_float(row[4]),
-                "subtotal": safe_float(row[5]),
-                "tax_amount": safe_float(row[6]),
-                "discount_amount": safe_float(row[7]),
-                "service_charge": safe_float(row[8]),
-                "tip_amount": safe_float(row[9]),
-                "order_status": safe_str(row[10]),
-                "order_type": safe_str(row[11]),
-                "terminal_id": safe_str(row[12])
-            }
-            records.append(record)
+        cursor.execute(sql, (start, end))
+        records = [_orderheader_record(row) for row in _iter_rows(cursor)]
         
         cursor.close()
         return records
@@ -180,7 +322,8 @@ def extract_orderpayments(conn, start_date, end_date=None):
     if not end_date:
         end_date = start_date
     
-    sql = f"""
+    start, end = _day_range(start_date, end_date)
+    sql = """
     SELECT 
         oh.OrderID,
         op.OrderPaymentID,
@@ -192,38 +335,14 @@ def extract_orderpayments(conn, start_date, end_date=None):
         op.PaymentDateTime
     FROM Orderpayments op
     INNER JOIN Orderheaders oh ON op.OrderID = oh.OrderID
-    WHERE oh.OrderDateTime IS NOT NULL
-      AND FORMAT(oh.OrderDateTime, 'yyyy-mm-dd') >= '{start_date}'
-      AND FORMAT(oh.OrderDateTime, 'yyyy-mm-dd') <= '{end_date}'
+    WHERE oh.OrderDateTime >= ? AND oh.OrderDateTime < ?
     ORDER BY op.PaymentDateTime DESC
     """
     
     try:
         cursor = conn.cursor()
-        cursor.execute(sql)
-        rows = cursor.fetchall()
-        
-        records = []
-        for row in rows:
-            payment_dt = safe_datetime(row[7])
-            time_str = payment_dt.split(' ')[-1] if payment_dt and ' ' in payment_dt else None
-            
-            amount_paid = safe_float(row[3])
-            amount_tendered = safe_float(row[4])
-
-            record = {
-                "order_id": safe_str(row[0]),
-                "payment_id": safe_str(row[1]),
-                "payment_type": safe_str(row[2]),
-                "payment_amount": amount_paid,
-                "tender_amount": amount_tendered,
-                "change_amount": amount_tendered - amount_paid,
-                "card_type": safe_str(row[5]),
-                "card_number": safe_str(row[6]),
-                "payment_date": payment_dt,
-                "payment_time": time_str
-            }
-            records.append(record)
+        cursor.execute(sql, (start, end))
+        records = [_orderpayment_record(row) for row in _iter_rows(cursor)]
         
         cursor.close()
         return records
@@ -240,7 +359,8 @@ def extract_account_invoice_erp(conn, start_date, end_date=None):
     if not end_date:
         end_date = start_date
     
-    sql = f"""
+    start, end = _day_range(start_date, end_date)
+    sql = """
     SELECT 
         OrderID,
         FacturaNumberERP,
@@ -248,30 +368,14 @@ def extract_account_invoice_erp(conn, start_date, end_date=None):
         CustomerID,
         BaseIva + BaseIva0 + BaseNoIva
     FROM AccountInvoiceERP
-    WHERE FechaEntrega IS NOT NULL
-      AND FORMAT(FechaEntrega, 'yyyy-mm-dd') >= '{start_date}'
-      AND FORMAT(FechaEntrega, 'yyyy-mm-dd') <= '{end_date}'
+    WHERE FechaEntrega >= ? AND FechaEntrega < ?
     ORDER BY FechaEntrega DESC
     """
     
     try:
         cursor = conn.cursor()
-        cursor.execute(sql)
-        rows = cursor.fetchall()
-        
-        records = []
-        for row in rows:
-            inv_date = safe_datetime(row[2])
-
-            record = {
-                "invoice_id": safe_str(row[0]),
-                "invoice_number": safe_str(row[1]),
-                "invoice_date": inv_date,
-                "account_id": safe_str(row[3]),
-                "account_name": "Customer",
-                "total_amount": safe_float(row[4]),
-            }
-            records.append(record)
+        cursor.execute(sql, (start, end))
+        records = [_account_invoice_record(row) for row in _iter_rows(cursor)]
         
         cursor.close()
         return records
@@ -295,8 +399,10 @@ def extract_orderdetails(conn, start_date, end_date=None):
     if not end_date:
         end_date = start_date
     
+    start, end = _day_range(start_date, end_date)
+    
     # MS Access requires parentheses for multiple JOINs
-    sql = f"""
+    sql = """
     SELECT 
         ot.OrderID,
         mi.MenuItemText,
@@ -307,26 +413,13 @@ def extract_orderdetails(conn, start_date, end_date=None):
     INNER JOIN OrderHeaders oh ON ot.OrderID = oh.OrderID)
     LEFT JOIN MenuItems mi ON ot.MenuItemID = mi.MenuItemID)
     LEFT JOIN MenuCategories mc ON mi.MenuCategoryID = mc.MenuCategoryID
-    WHERE oh.OrderDateTime >= #{start_date}#
-      AND oh.OrderDateTime < #{end_date}# + 1
+    WHERE oh.OrderDateTime >= ? AND oh.OrderDateTime < ?
     """
     
     try:
         cursor = conn.cursor()
-        cursor.execute(sql)
-        rows = cursor.fetchall()
-        
-        records = []
-        for row in rows:
-            item_name = safe_str(row[1]) if row[1] else "Producto sin nombre"
-            record = {
-                "order_id": safe_str(row[0]),
-                "item_name": item_name,
-                "quantity": safe_float(row[2]),
-                "price": safe_float(row[3]),
-                "category": safe_str(row[4]) if row[4] else "Sin categoría"
-            }
-            records.append(record)
+        cursor.execute(sql, (start, end))
+        records = [_orderdetail_record(row) for row in _iter_rows(cursor)]
         
         cursor.close()
         logger.info(f"Extracted {len(records)} order transaction records (products)")
@@ -336,3 +429,405 @@ def extract_orderdetails(conn, start_date, end_date=None):
         return []
 
 
+
+
+ORDERS_PROBE_SQL = "SELECT TOP 1 1 FROM Orderheaders WHERE OrderDateTime >= ? AND OrderDateTime < ?"
+
+_HEADER_NULLS = ", ".join(["NULL"] * 12)
+_PAYMENT_NULLS = ", ".join(["NULL"] * 7)
+_DETAIL_NULLS = ", ".join(["NULL"] * 4)
+
+# Combined headers/payments/details query. Every branch filters on the
+# half-open range OrderDateTime >= ? AND OrderDateTime < ?, so the text never
+# changes between months and the driver can keep it prepared on a cursor.
+#
+# Jet takes each UNION column's type from the first SELECT, where a bare NULL
+# has no type. The leading branch therefore selects every real column from
+# the joined tables and returns no rows (WHERE 1 = 0), so amounts and dates
+# keep their own types in the payment and detail blocks.
+MONTH_BUNDLE_SQL = f"""
+    SELECT 
+        'T' AS tag,
+        oh.OrderID,
+        oh.OrderDateTime, oh.DineInTableID, oh.EmployeeID, oh.AmountDue, oh.SubTotal,
+        oh.SalesTaxAmountUsed, oh.DiscountAmount, oh.SurchargeAmount, oh.CashGratuity,
+        oh.OrderStatus, oh.OrderType, oh.StationID,
+        op.OrderPaymentID, op.PaymentMethod, op.AmountPaid, op.AmountTendered,
+        op.EDCCardType, op.EDCCardLast4, op.PaymentDateTime,
+        mi.MenuItemText, ot.Quantity, ot.ExtendedPrice, mc.MenuCategoryText
+    FROM (((Orderheaders oh
+    INNER JOIN Orderpayments op ON op.OrderID = oh.OrderID)
+    INNER JOIN OrderTransactions ot ON ot.OrderID = oh.OrderID)
+    LEFT JOIN MenuItems mi ON ot.MenuItemID = mi.MenuItemID)
+    LEFT JOIN MenuCategories mc ON mi.MenuCategoryID = mc.MenuCategoryID
+    WHERE 1 = 0
+    UNION ALL
+    SELECT 
+        'H',
+        OrderID,
+        OrderDateTime, DineInTableID, EmployeeID, AmountDue, SubTotal,
+        SalesTaxAmountUsed, DiscountAmount, SurchargeAmount, CashGratuity,
+        OrderStatus, OrderType, StationID,
+        {_PAYMENT_NULLS},
+        {_DETAIL_NULLS}
+    FROM Orderheaders
+    WHERE OrderDateTime >= ? AND OrderDateTime < ?
+    UNION ALL
+    SELECT 
+        'P',
+        oh.OrderID,
+        {_HEADER_NULLS},
+        op.OrderPaymentID, op.PaymentMethod, op.AmountPaid, op.AmountTendered,
+        op.EDCCardType, op.EDCCardLast4, op.PaymentDateTime,
+        {_DETAIL_NULLS}
+    FROM Orderpayments op
+    INNER JOIN Orderheaders oh ON op.OrderID = oh.OrderID
+    WHERE oh.OrderDateTime >= ? AND oh.OrderDateTime < ?
+    UNION ALL
+    SELECT 
+        'D',
+        ot.OrderID,
+        {_HEADER_NULLS},
+        {_PAYMENT_NULLS},
+        mi.MenuItemText, ot.Quantity, ot.ExtendedPrice, mc.MenuCategoryText
+    FROM ((OrderTransactions ot
+    INNER JOIN OrderHeaders oh ON ot.OrderID = oh.OrderID)
+    LEFT JOIN MenuItems mi ON ot.MenuItemID = mi.MenuItemID)
+    LEFT JOIN MenuCategories mc ON mi.MenuCategoryID = mc.MenuCategoryID
+    WHERE oh.OrderDateTime >= ? AND oh.OrderDateTime < ?
+    """
+
+
+# Pick each branch's columns (plus OrderID) out of a bundle row in one call
+_BUNDLE_HEADER = itemgetter(*range(1, 14))
+_BUNDLE_PAYMENT = itemgetter(1, *range(14, 21))
+_BUNDLE_DETAIL = itemgetter(1, *range(21, 25))
+
+_NUMBER_TYPES = (int, float, Decimal)
+
+
+def _bundle_row_typed(tag, row):
+    """
+    True if a 'P' or 'D' bundle row's amount and date columns came back as
+    numbers and datetimes. A provider that typed them from NULLs would hand
+    back text or bytes, which safe_float would quietly turn into 0.0.
+    """
+    if tag == 'P':
+        checks = ((row[16], _NUMBER_TYPES), (row[17], _NUMBER_TYPES), (row[20], datetime))
+    else:
+        checks = ((row[22], _NUMBER_TYPES), (row[23], _NUMBER_TYPES))
+    return all(value is None or isinstance(value, kind) for value, kind in checks)
+
+
+RANGE_BUCKET_MINUTES = 10
+
+
+def _round_bucket(dt, minutes=RANGE_BUCKET_MINUTES, up=False):
+    """
+    Snap a datetime to a `minutes` bucket boundary (down, or up when `up`),
+    so bounds taken from the clock stay identical within a bucket.
+    """
+    floored = dt.replace(minute=dt.minute - dt.minute % minutes, second=0, microsecond=0)
+    if up and floored != dt:
+        floored += timedelta(minutes=minutes)
+    return floored
+
+
+def _day_range(start_date, end_date):
+    """
+    Half-open datetime bounds [start, end + 1 day) for inclusive day bounds
+    given as YYYY-MM-DD strings or date objects (dates are used as-is).
+    datetime bounds are kept as instants instead, widened to whole
+    RANGE_BUCKET_MINUTES buckets: [floor(start), ceil(end)).
+    """
+    if isinstance(start_date, datetime) or isinstance(end_date, datetime):
+        start = _round_bucket(start_date) if isinstance(start_date, datetime) else _day_range(start_date, start_date)[0]
+        end = _round_bucket(end_date, up=True) if isinstance(end_date, datetime) else _day_range(end_date, end_date)[1]
+        logger.debug(f"Range rounded to {start} - {end}")
+        return start, end
+    
+    if isinstance(start_date, str):
+        start_date = datetime.strptime(start_date, '%Y-%m-%d')
+    if isinstance(end_date, str):
+        end_date = datetime.strptime(end_date, '%Y-%m-%d')
+    start = datetime(start_date.year, start_date.month, start_date.day)
+    end = datetime(end_date.year, end_date.month, end_date.day) + timedelta(days=1)
+    return start, end
+
+
+def has_orders_in_range(conn, start_date, end_date, cursor=None):
+    """
+    Cheap existence probe: True if any order falls between start_date and
+    end_date (inclusive, YYYY-MM-DD or date). Reads at most one row, so empty ranges
+    can be skipped without running the full extraction queries.
+    """
+    start, end = _day_range(start_date, end_date)
+    
+    owns_cursor = cursor is None
+    if owns_cursor:
+        cursor = conn.cursor()
+    try:
+        cursor.execute(ORDERS_PROBE_SQL, (start, end))
+        return cursor.fetchone() is not None
+    finally:
+        if owns_cursor:
+            cursor.close()
+
+
+def iter_month_bundle(conn, start_date, end_date, chunk_size=5000, cursor=None):
+    """
+    Stream orderheaders, orderpayments and orderdetails from a single
+    UNION ALL round-trip. Each branch fills its own block of columns
+    (NULL elsewhere) and is tagged H/P/D so rows can be bucketed client-side.
+    
+    Rows are fetched `chunk_size` at a time, so memory is bounded by the
+    chunk rather than the whole date range. Falls back to the three separate
+    queries (yielded as one chunk) if the provider rejects the combined
+    statement. The first payment and detail rows are type-checked; if either
+    came back mistyped, that table is skipped in the bundle and read with its
+    own query at the end instead.
+    
+    The date range is bound as parameters. Pass the same `cursor` for every
+    month to reuse its prepared statement; it is left open for the caller.
+    
+    Yields:
+        dict: {'orderheaders': [...], 'orderpayments': [...], 'orderdetails': [...]}
+    """
+    start, end = _day_range(start_date, end_date)
+    params = (start, end) * 3
+    
+    owns_cursor = cursor is None
+    
+    try:
+        if owns_cursor:
+            cursor = conn.cursor()
+        cursor.execute(MONTH_BUNDLE_SQL, params)
+    except Exception as e:
+        logger.warning(f"Combined month query failed, using separate queries: {e}")
+        yield {
+            "orderheaders": extract_orderheaders(conn, start_date, end_date),
+            "orderpayments": extract_orderpayments(conn, start_date, end_date),
+            "orderdetails": extract_orderdetails(conn, start_date, end_date)
+        }
+        return
+    
+    # Tags whose first row hasn't been type-checked yet / that are read separately
+    unchecked = {'P', 'D'}
+    separate = set()
+    
+    try:
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            
+            orderheaders = []
+            orderpayments = []
+            orderdetails = []
+            # Bound once per batch instead of looked up on every row
+            add_header, add_payment, add_detail = orderheaders.append, orderpayments.append, orderdetails.append
+            header_record, payment_record, detail_record = _orderheader_record, _orderpayment_record, _orderdetail_record
+            for row in rows:
+                tag = row[0]
+                if tag == 'H':
+                    add_header(header_record(_BUNDLE_HEADER(row)))
+                    continue
+                if unchecked and tag in unchecked:
+                    unchecked.discard(tag)
+                    if not _bundle_row_typed(tag, row):
+                        logger.warning(f"Combined month query returned mistyped '{tag}' columns, reading that table separately")
+                        separate.add(tag)
+                if separate and tag in separate:
+                    continue
+                if tag == 'P':
+                    add_payment(payment_record(_BUNDLE_PAYMENT(row)))
+                else:
+                    add_detail(detail_record(_BUNDLE_DETAIL(row)))
+            
+            yield {
+                "orderheaders": orderheaders,
+                "orderpayments": orderpayments,
+                "orderdetails": orderdetails
+            }
+        
+        if separate:
+            yield {
+                "orderheaders": [],
+                "orderpayments": extract_orderpayments(conn, start_date, end_date) if 'P' in separate else [],
+                "orderdetails": extract_orderdetails(conn, start_date, end_date) if 'D' in separate else []
+            }
+    finally:
+        if owns_cursor:
+            cursor.close()
+
+
+INVOICE_RANGE_SQL = """
+    SELECT 
+        OrderID,
+        FacturaNumberERP,
+        FechaEntrega,
+        CustomerID,
+        BaseIva + BaseIva0 + BaseNoIva
+    FROM AccountInvoiceERP
+    WHERE FechaEntrega >= ? AND FechaEntrega < ?
+    """
+
+
+def iter_account_invoice_erp(conn, start_date, end_date, batch_size=5000):
+    """
+    Stream AccountInvoiceERP records between start_date and end_date
+    (inclusive, YYYY-MM-DD or date), `batch_size` rows at a time.
+    """
+    start, end = _day_range(start_date, end_date)
+    
+    cursor = conn.cursor()
+    try:
+        cursor.execute(INVOICE_RANGE_SQL, (start, end))
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield [_account_invoice_record(row) for row in rows]
+    finally:
+        cursor.close()
+
+
+def extract_all_data_iter(db_path, run_date=None, config=None, conn=None, batch_size=5000):
+    """
+    Streaming variant of extract_all_data: yields (table_name, rows_batch)
+    tuples of at most `batch_size` records instead of building every table
+    in memory first. Table names match the keys of extract_all_data.
+    
+    Headers, payments and details come from one iter_month_bundle
+    round-trip; invoices are read separately. Connection handling is the
+    same as extract_all_data. Errors are raised to the caller, since
+    batches already yielded cannot be taken back.
+    """
+    lookback_days = config.get("lookback_days", 30) if config else 30
+    
+    if run_date:
+        start_date = end_date = run_date
+        logger.info(f"Streaming data for specific date: {run_date}")
+    else:
+        end_date = datetime.now().strftime('%Y-%m-%d')
+        start_date = (datetime.now() - timedelta(days=lookback_days)).strftime('%Y-%m-%d')
+        logger.info(f"Streaming data from {start_date} to {end_date} ({lookback_days} days)")
+    
+    read_only = config.get("read_only", True) if config else True
+    strategy = config.get("connection_strategy", ["oledb", "odbc"])[0] if config else "auto"
+    
+    if conn is None:
+        with ConnectionHolder.get(db_path, strategy, read_only).acquire() as conn:
+            yield from _stream_tables(conn, start_date, end_date, batch_size)
+    else:
+        yield from _stream_tables(conn, start_date, end_date, batch_size)
+
+
+def _stream_tables(conn, start_date, end_date, batch_size):
+    """Yield (table_name, rows_batch) for every table on an open connection."""
+    for bundle in iter_month_bundle(conn, start_date, end_date, chunk_size=batch_size):
+        for table, rows in bundle.items():
+            # The separate-query fallback returns whole tables
+            for i in range(0, len(rows), batch_size):
+                yield table, rows[i:i + batch_size]
+    
+    for rows in iter_account_invoice_erp(conn, start_date, end_date, batch_size):
+        yield "account_invoice_erp", rows
+
+
+ORDERHEADERS_CSV_COLUMNS = (
+    "OrderID", "OrderDateTime", "DineInTableID", "EmployeeID", "AmountDue", "SubTotal",
+    "SalesTaxAmountUsed", "DiscountAmount", "SurchargeAmount", "CashGratuity",
+    "OrderStatus", "OrderType", "StationID"
+)
+
+
+# Text ISAM only opens files with these extensions
+_TEXT_ISAM_EXTENSIONS = frozenset({".csv", ".txt", ".tab", ".asc"})
+# Can't be quoted in the connect string's DATABASE= / a bracketed Jet name
+_TEXT_ISAM_BAD_FOLDER_CHARS = frozenset(";[]")
+_TEXT_ISAM_BAD_NAME_CHARS = frozenset(".!`[]")
+
+
+def _text_isam_target(out_path):
+    """
+    The SELECT ... INTO target for writing out_path through the Text ISAM,
+    e.g. [Text;...;DATABASE=C:\\out].[orders#csv], or None if the path
+    can't be expressed safely (the caller then writes the file itself).
+    """
+    folder, filename = os.path.split(out_path)
+    stem, ext = os.path.splitext(filename)
+    if ext.lower() not in _TEXT_ISAM_EXTENSIONS or not stem:
+        return None
+    if _TEXT_ISAM_BAD_FOLDER_CHARS & set(folder) or _TEXT_ISAM_BAD_NAME_CHARS & set(stem):
+        return None
+    # The Text ISAM names a file "name.csv" as table [name#csv]
+    return f"[Text;HDR=YES;FMT=Delimited;DATABASE={folder}].[{stem}#{ext[1:]}]"
+
+
+def extract_orderheaders_to_csv(conn, start_date, end_date, out_path):
+    """
+    Export raw Orderheaders rows between start_date and end_date (inclusive,
+    YYYY-MM-DD or date) to a CSV file with a header row, for loaders that
+    read files rather than record dicts.
+    
+    The engine writes the file itself with SELECT ... INTO a Text ISAM
+    table, so no row passes through Python. If the path can't be passed to
+    the Text ISAM (unsupported extension, or characters that would break
+    the connect string or table name) or the provider refuses (text driver
+    missing, folder not writable), rows are streamed to the file with the
+    csv module instead. An existing file at out_path is replaced.
+    
+    Returns:
+        str: out_path
+    """
+    start, end = _day_range(start_date, end_date)
+    out_path = os.path.abspath(out_path)
+    columns = ", ".join(ORDERHEADERS_CSV_COLUMNS)
+    
+    if os.path.exists(out_path):
+        os.remove(out_path)
+    
+    target = _text_isam_target(out_path)
+    if target is None:
+        logger.info(f"Text ISAM can't write {out_path}, writing CSV from Python")
+    else:
+        sql = f"""
+        SELECT {columns}
+        INTO {target}
+        FROM Orderheaders
+        WHERE OrderDateTime >= ? AND OrderDateTime < ?
+        """
+        
+        cursor = conn.cursor()
+        try:
+            cursor.execute(sql, (start, end))
+            logger.info(f"Exported orderheaders to {out_path}")
+            return out_path
+        except Exception as e:
+            logger.warning(f"SELECT INTO text export failed, writing CSV from Python: {e}")
+        finally:
+            cursor.close()
+    
+    if os.path.exists(out_path):
+        os.remove(out_path)
+    
+    cursor = conn.cursor()
+    try:
+        cursor.execute(
+            f"SELECT {columns} FROM Orderheaders WHERE OrderDateTime >= ? AND OrderDateTime < ?",
+            (start, end)
+        )
+        with open(out_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            writer.writerow(ORDERHEADERS_CSV_COLUMNS)
+            while True:
+                rows = cursor.fetchmany(5000)
+                if not rows:
+                    break
+                writer.writerows(rows)
+    finally:
+        cursor.close()
+    
+    logger.info(f"Exported orderheaders to {out_path}")
+    return out_path
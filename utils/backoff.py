@@ -0,0 +1,24 @@
+"""
+Retry backoff helper shared by the agents and the historical extractor.
+
+Delays grow exponentially per attempt, are capped, and get random jitter
+added so many agents retrying at once don't hit the server in lockstep.
+"""
+
+import random
+
+
+def backoff_delay(attempt, base, cap, jitter=0.0):
+    """
+    Seconds to wait before the next retry.
+    
+    Args:
+        attempt: 0-based retry attempt number
+        base: Delay for the first retry
+        cap: Maximum delay before jitter
+        jitter: Maximum random seconds added on top
+        
+    Returns:
+        float: min(cap, base * 2**attempt) + uniform(0, jitter)
+    """
+    return min(cap, base * (2 ** attempt)) + random.uniform(0, jitter)
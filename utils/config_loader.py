@@ -0,0 +1,45 @@
+"""
+Cached config.json loader.
+
+The parsed config is kept in memory and only re-read from disk when the
+file's modification time changes.
+"""
+
+import os
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# path -> (mtime_ns, parsed config)
+_CONFIG_CACHE = {}
+
+
+def load_config_cached(path):
+    """
+    Load a JSON config file, reusing the parsed dict until the file changes.
+    
+    Args:
+        path: Path to config.json (str or Path)
+        
+    Returns:
+        dict: Parsed configuration
+        
+    Raises:
+        FileNotFoundError / json.JSONDecodeError, as json.load would
+    """
+    key = os.fspath(path)
+    mtime = os.stat(key).st_mtime_ns
+    
+    hit = _CONFIG_CACHE.get(key)
+    if hit and hit[0] == mtime:
+        return hit[1]
+    
+    with open(key, 'rb') as f:
+        raw = f.read()
+    config = orjson.loads(raw) if orjson else json.loads(raw)
+    
+    _CONFIG_CACHE[key] = (mtime, config)
+    return config
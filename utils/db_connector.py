@@ -13,12 +13,55 @@ Features:
 - Comprehensive error logging
 """
 
+import os
+import json
+import atexit
 import logging
 import platform
+import threading
 import time
+import weakref
+from contextlib import contextmanager
+from datetime import datetime
 
 logger = logging.getLogger("WindowsAgent.DBConnector")
 
+# ADO SchemaEnum values for Connection.OpenSchema
+AD_SCHEMA_COLUMNS = 4
+AD_SCHEMA_TABLES = 20
+
+# ADO Command / Parameter constants
+AD_CMD_TEXT = 1
+AD_PARAM_INPUT = 1
+AD_INTEGER = 3
+AD_DOUBLE = 5
+AD_DATE = 7
+AD_VAR_WCHAR = 202
+
+# Recordset.GetRows count meaning "all remaining rows"
+AD_GET_ROWS_REST = -1
+
+# Connection.State when open
+AD_STATE_OPEN = 1
+
+# Recordset cursor settings: rows are only ever read forward, once
+AD_USE_SERVER = 2
+AD_OPEN_FORWARD_ONLY = 0
+AD_LOCK_READ_ONLY = 1
+
+# ODBC drivers to try, in order of preference
+ODBC_DRIVERS = [
+    "{Microsoft Access Driver (*.mdb, *.accdb)}",  # ACE/Jet 4.0
+    "{Microsoft Access Driver (*.mdb)}",           # Legacy Jet
+]
+
+# Strategy (and ODBC driver) that last connected, so later starts try it first
+ENV_CACHE_FILE = os.path.join(
+    os.environ.get("LOCALAPPDATA") or os.path.expanduser("~"),
+    "aldelo-agent",
+    "env.json"
+)
+
 
 class DatabaseConnectionError(Exception):
     """Raised when all connection strategies fail"""
@@ -40,30 +83,53 @@ def get_connection(db_path, strategy="auto", read_only=True, retry_attempts=3):
         
     Raises:
         DatabaseConnectionError: If all strategies fail
+        FileNotFoundError: If db_path does not exist (not retried)
     """
     strategies = _determine_strategies(strategy)
     
+    # A missing file won't appear by retrying; the DSN strategy carries its own path
+    if strategies != ["odbc_dsn"] and not os.path.isfile(db_path):
+        raise FileNotFoundError(f"Database file not found: {db_path}")
+    
+    # Go straight to the settings that worked last time, if they still apply
+    cached = _read_env_cache(db_path, read_only)
+    if cached and cached.get("strategy") in strategies:
+        strat_name = cached["strategy"]
+        try:
+            conn, _ = _connect_with(strat_name, db_path, read_only, cached.get("driver"))
+            logger.info(f"✓ Successfully connected via {strat_name.upper()} (cached settings)")
+            return conn
+        except Exception as e:
+            logger.warning(f"Cached connection settings failed, trying all strategies: {e}")
+            _clear_env_cache()
+    
+    # Strategies that can never work here (missing package, wrong OS)
+    dead_strategies = set()
+    
     for attempt in range(retry_attempts):
         for strat_name in strategies:
+            if strat_name in dead_strategies:
+                continue
             try:
                 logger.info(f"Attempting connection via {strat_name.upper()} (attempt {attempt + 1}/{retry_attempts})")
                 
-                if strat_name == "oledb":
-                    conn = _connect_oledb(db_path, read_only)
-                elif strat_name == "odbc":
-                    conn = _connect_odbc(db_path, read_only)
-                elif strat_name == "odbc_dsn":
-                    conn = _connect_odbc_dsn(db_path, read_only)
-                else:
-                    continue
+                conn, driver = _connect_with(strat_name, db_path, read_only)
                 
                 logger.info(f"✓ Successfully connected via {strat_name.upper()}")
+                _write_env_cache(db_path, read_only, strat_name, driver)
                 return conn
                 
+            except (ImportError, NotImplementedError) as e:
+                logger.warning(f"Connection via {strat_name.upper()} unavailable: {e}")
+                dead_strategies.add(strat_name)
+                continue
             except Exception as e:
                 logger.warning(f"Connection via {strat_name.upper()} failed: {e}")
                 continue
         
+        if dead_strategies.issuperset(strategies):
+            break
+        
         # Wait before retry (exponential backoff)
         if attempt < retry_attempts - 1:
             wait_time = 2 ** attempt  # 1s, 2s, 4s...
@@ -75,6 +141,59 @@ def get_connection(db_path, strategy="auto", read_only=True, retry_attempts=3):
     )
 
 
+def _connect_with(strat_name, db_path, read_only, driver=None):
+    """
+    Connect with one strategy. Returns (conn, driver), where driver is the
+    ODBC driver string that worked (None for the other strategies).
+    `driver` restricts the ODBC strategy to that driver.
+    """
+    if strat_name == "oledb":
+        return _connect_oledb(db_path, read_only), None
+    if strat_name == "odbc":
+        return _connect_odbc(db_path, read_only, drivers=[driver] if driver else ODBC_DRIVERS)
+    if strat_name == "odbc_dsn":
+        return _connect_odbc_dsn(db_path, read_only), None
+    raise ValueError(f"Unknown connection strategy: {strat_name}")
+
+
+def _read_env_cache(db_path, read_only):
+    """Cached connection settings for this database, or None."""
+    try:
+        with open(ENV_CACHE_FILE, 'r', encoding='utf-8') as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(cached, dict):
+        return None
+    if cached.get("db_path") != db_path or cached.get("read_only") != read_only:
+        return None
+    return cached
+
+
+def _write_env_cache(db_path, read_only, strat_name, driver):
+    """Remember the connection settings that just worked."""
+    try:
+        os.makedirs(os.path.dirname(ENV_CACHE_FILE), exist_ok=True)
+        with open(ENV_CACHE_FILE, 'w', encoding='utf-8') as f:
+            json.dump({
+                "db_path": db_path,
+                "read_only": read_only,
+                "strategy": strat_name,
+                "driver": driver,
+                "timestamp": time.time()
+            }, f)
+    except OSError as e:
+        logger.debug(f"Could not write connection cache: {e}")
+
+
+def _clear_env_cache():
+    """Forget cached connection settings after they stopped working."""
+    try:
+        os.remove(ENV_CACHE_FILE)
+    except OSError:
+        pass
+
+
 def _determine_strategies(strategy):
     """Determine which connection strategies to try"""
     if strategy == "auto":
@@ -124,23 +243,18 @@ def _connect_oledb(db_path, read_only=True):
         raise DatabaseConnectionError(f"OLEDB connection failed: {e}")
 
 
-def _connect_odbc(db_path, read_only=True):
+def _connect_odbc(db_path, read_only=True, drivers=ODBC_DRIVERS):
     """
     Connect via ODBC without DSN.
     Requires pyodbc package and Microsoft Access Database Engine.
-    Tries ACE driver first, then legacy Jet driver.
+    Tries `drivers` in order (ACE driver first, then legacy Jet).
+    Returns (conn, driver) so the working driver can be remembered.
     """
     try:
         import pyodbc
     except ImportError:
         raise ImportError("pyodbc package required for ODBC connections")
     
-    # Try drivers in order of preference
-    drivers = [
-        "{Microsoft Access Driver (*.mdb, *.accdb)}",  # ACE/Jet 4.0
-        "{Microsoft Access Driver (*.mdb)}",           # Legacy Jet
-    ]
-    
     last_error = None
     for driver in drivers:
         conn_str = f"DRIVER={driver};DBQ={db_path};"
@@ -150,7 +264,7 @@ def _connect_odbc(db_path, read_only=True):
         try:
             conn = pyodbc.connect(conn_str)
             logger.info(f"Connected using driver: {driver}")
-            return conn
+            return conn, driver
         except Exception as e:
             last_error = e
             logger.debug(f"Driver {driver} failed: {e}")
@@ -190,6 +304,40 @@ class OLEDBConnection:
         """Return a cursor-like object"""
         return OLEDBCursor(self.conn)
     
+    def get_tables(self):
+        """List user table names from the schema rowset (no data pages read)"""
+        rs = self.conn.OpenSchema(AD_SCHEMA_TABLES)
+        tables = []
+        try:
+            # Field objects track the current row, so resolve them once
+            fields = rs.Fields
+            type_field = fields.Item("TABLE_TYPE")
+            name_field = fields.Item("TABLE_NAME")
+            while not rs.EOF:
+                if type_field.Value == "TABLE":
+                    tables.append(name_field.Value)
+                rs.MoveNext()
+        finally:
+            rs.Close()
+        return tables
+    
+    def get_columns(self, table_name):
+        """List column names of a table from the schema rowset, in ordinal order"""
+        import pythoncom
+        empty = pythoncom.Empty
+        rs = self.conn.OpenSchema(AD_SCHEMA_COLUMNS, [empty, empty, table_name, empty])
+        columns = []
+        try:
+            fields = rs.Fields
+            position_field = fields.Item("ORDINAL_POSITION")
+            name_field = fields.Item("COLUMN_NAME")
+            while not rs.EOF:
+                columns.append((position_field.Value, name_field.Value))
+                rs.MoveNext()
+        finally:
+            rs.Close()
+        return [name for _, name in sorted(columns)]
+    
     def close(self):
         """Close the connection"""
         if not self._closed:
@@ -206,6 +354,17 @@ class OLEDBConnection:
         self.close()
 
 
+def _ado_type(value):
+    """Map a Python parameter value to its ADO DataTypeEnum"""
+    if isinstance(value, datetime):
+        return AD_DATE
+    if isinstance(value, bool) or isinstance(value, int):
+        return AD_INTEGER
+    if isinstance(value, float):
+        return AD_DOUBLE
+    return AD_VAR_WCHAR
+
+
 class OLEDBCursor:
     """
     Cursor-like wrapper for OLEDB recordset.
@@ -213,6 +372,10 @@ class OLEDBCursor:
     def __init__(self, adodb_conn):
         self.conn = adodb_conn
         self.recordset = None
+        # Rows buffered per provider round-trip (maps to Recordset.CacheSize)
+        self.arraysize = 1
+        # Prepared ADODB.Command objects for parameterized SQL, keyed by SQL text
+        self._commands = {}
     
     @property
     def description(self):
@@ -230,7 +393,10 @@ class OLEDBCursor:
 
     @property
     def rowcount(self):
-        """Return number of rows (standard DB-API)"""
+        """
+        Return number of rows (standard DB-API). Recordsets are forward-only,
+        so this is normally -1; count fetched rows instead.
+        """
         if not self.recordset:
             return -1
         try:
@@ -238,8 +404,8 @@ class OLEDBCursor:
         except:
             return -1
 
-    def execute(self, sql):
-        """Execute SQL query"""
+    def execute(self, sql, params=None):
+        """Execute SQL query, binding `?` markers from `params` when given"""
         try:
             import win32com.client
             # Close existing recordset if any
@@ -248,21 +414,77 @@ class OLEDBCursor:
                 except: pass
             
             self.recordset = win32com.client.Dispatch("ADODB.Recordset")
-            # 3 = adOpenStatic (allows RecordCount), 1 = adLockReadOnly
-            self.recordset.Open(sql, self.conn, 3, 1)
+            self.recordset.CacheSize = max(1, int(self.arraysize))
+            # Server-side forward-only cursor: rows stream from the provider
+            # instead of being copied into a static client-side set first
+            self.recordset.CursorLocation = AD_USE_SERVER
+            if params:
+                import pythoncom
+                command = self._prepare(sql, params)
+                for i, value in enumerate(params):
+                    command.Parameters.Item(i).Value = value
+                # The command carries the connection, so ActiveConnection is omitted
+                self.recordset.Open(command, pythoncom.Missing, AD_OPEN_FORWARD_ONLY, AD_LOCK_READ_ONLY)
+            else:
+                self.recordset.Open(sql, self.conn, AD_OPEN_FORWARD_ONLY, AD_LOCK_READ_ONLY)
         except Exception as e:
             raise Exception(f"Query execution failed: {e}")
     
+    def _prepare(self, sql, params):
+        """Return the prepared ADODB.Command for `sql`, building it on first use"""
+        command = self._commands.get(sql)
+        if command is not None:
+            return command
+        
+        import win32com.client
+        command = win32com.client.Dispatch("ADODB.Command")
+        command.ActiveConnection = self.conn
+        command.CommandText = sql
+        command.CommandType = AD_CMD_TEXT
+        command.Prepared = True
+        for value in params:
+            command.Parameters.Append(
+                command.CreateParameter("", _ado_type(value), AD_PARAM_INPUT, 255)
+            )
+        
+        self._commands[sql] = command
+        return command
+    
+    def fetchone(self):
+        """Fetch the next row as a tuple, or None when no rows remain"""
+        rows = self.fetchmany(1)
+        return rows[0] if rows else None
+    
+    def fetchmany(self, size=None):
+        """Fetch up to `size` rows (default: arraysize) as list of tuples"""
+        if size is None:
+            size = self.arraysize
+        return self._fetch(size)
+    
     def fetchall(self):
         """Fetch all results as list of tuples"""
+        return self._fetch(AD_GET_ROWS_REST)
+    
+    def _fetch(self, count):
+        """
+        Read `count` rows (AD_GET_ROWS_REST for all) with one Recordset.GetRows
+        call instead of one COM call per cell. Falls back to walking Fields
+        if the provider rejects GetRows.
+        """
         if not self.recordset or self.recordset.EOF:
             return []
         
+        try:
+            # Column-major: one tuple per field
+            return list(zip(*self.recordset.GetRows(count)))
+        except Exception:
+            pass
+        
         results = []
-        fields = [field.Name for field in self.recordset.Fields]
+        field_count = self.recordset.Fields.Count
         
-        while not self.recordset.EOF:
-            row = tuple(self.recordset.Fields[i].Value for i in range(len(fields)))
+        while (count < 0 or len(results) < count) and not self.recordset.EOF:
+            row = tuple(self.recordset.Fields[i].Value for i in range(field_count))
             results.append(row)
             self.recordset.MoveNext()
         
@@ -300,3 +522,104 @@ def test_connection(db_path, strategy="auto"):
         result["error"] = str(e)
     
     return result
+
+
+def init_com_thread():
+    """Initialize COM on a worker thread that will open OLEDB connections."""
+    try:
+        import pythoncom
+        pythoncom.CoInitialize()
+    except ImportError:
+        pass
+
+
+class ConnectionHolder:
+    """
+    Keeps one long-lived connection per (db_path, strategy, read_only) and
+    thread, so scheduled extractions skip the provider handshake. COM and
+    pyodbc connections are not shared across threads; each thread that
+    calls acquire() gets its own. Holders live in thread-local storage, so
+    a thread's connections are released when the thread exits.
+    """
+    _local = threading.local()
+    # Every live holder on any thread, for close_all() at exit
+    _live = weakref.WeakSet()
+    _live_lock = threading.Lock()
+    
+    def __init__(self, db_path, strategy, read_only):
+        self.db_path = db_path
+        self.strategy = strategy
+        self.read_only = read_only
+        self.conn = None
+    
+    @classmethod
+    def get(cls, db_path, strategy="auto", read_only=True):
+        """Return the holder for these settings on the calling thread."""
+        holders = getattr(cls._local, "holders", None)
+        if holders is None:
+            holders = cls._local.holders = {}
+        key = (db_path, strategy, read_only)
+        holder = holders.get(key)
+        if holder is None:
+            holder = holders[key] = cls(db_path, strategy, read_only)
+            with cls._live_lock:
+                cls._live.add(holder)
+        return holder
+    
+    @classmethod
+    def close_thread(cls):
+        """Close the calling thread's connections (call before a worker thread exits)."""
+        holders = getattr(cls._local, "holders", None) or {}
+        cls._local.holders = {}
+        for holder in holders.values():
+            holder.reset()
+    
+    @classmethod
+    def close_all(cls):
+        """Close every held connection (registered with atexit)."""
+        with cls._live_lock:
+            holders = list(cls._live)
+        for holder in holders:
+            holder.reset()
+    
+    @contextmanager
+    def acquire(self):
+        """
+        Yield the held connection, reconnecting if it was never opened or
+        has gone stale. The connection is dropped if the caller raises, so
+        the next acquire() starts from a fresh one.
+        """
+        if self.conn is not None and not _is_alive(self.conn):
+            logger.info("Held database connection is no longer usable, reconnecting")
+            self.reset()
+        if self.conn is None:
+            self.conn = get_connection(self.db_path, strategy=self.strategy, read_only=self.read_only)
+        
+        try:
+            yield self.conn
+        except BaseException:
+            self.reset()
+            raise
+    
+    def reset(self):
+        """Close and forget the held connection."""
+        conn, self.conn = self.conn, None
+        if conn is not None:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+
+def _is_alive(conn):
+    """Cheap health check: ADO State for OLEDB, a trivial query for pyodbc."""
+    try:
+        if isinstance(conn, OLEDBConnection):
+            return not conn._closed and conn.conn.State == AD_STATE_OPEN
+        conn.cursor().execute("SELECT 1").fetchone()
+        return True
+    except Exception:
+        return False
+
+
+atexit.register(ConnectionHolder.close_all)
@@ -16,6 +16,8 @@ Keys searched (in order):
 """
 
 import os
+import re
+import json
 import logging
 import platform
 
@@ -49,6 +51,26 @@ COMMON_PATHS = [
     r"C:\Program Files (x86)\Aldelo\Aldelo For Restaurants\Data",
     r"C:\Aldelo For Restaurants\Data"
 ]
+# Database files worth considering in a scan: .mdb/.accdb, not backups or ~ temp files
+_LIVE_DB_RE = re.compile(r'^(?!~)(?!.*backup).*\.(mdb|accdb)$', re.IGNORECASE)
+
+# Lowercased DEFAULT_DB_NAMES, preferred over other names found in a scan
+_DEFAULT_DB_NAMES = frozenset(name.lower() for name in DEFAULT_DB_NAMES)
+
+# Subfolders skipped when searching one level down for the live DB
+_SKIP_DIRS = frozenset({"data", "backup", "logs", "temp", "backups", "export", "images"})
+
+# Last detected path, remembered across runs so the filesystem search only
+# happens again when that file disappears, the registry values change or
+# the folder that was scanned changes
+DB_PATH_CACHE_FILE = os.path.join(
+    os.environ.get("LOCALAPPDATA") or os.path.expanduser("~"),
+    "aldelo-agent",
+    "db_path.cache"
+)
+
+# In-memory copy of the cache entry written by _write_cached_db_path
+_cached_db_path = None
 
 
 def get_aldelo_db_path():
@@ -58,6 +80,17 @@ def get_aldelo_db_path():
     Returns:
         str: Full path to Aldelo database file, or None if not found
     """
+    return _detect_db_path(_read_registry_values())[0]
+
+
+def _read_registry_values():
+    """
+    Read the REGISTRY_KEYS values under every REGISTRY_PATHS key.
+    
+    Returns:
+        dict: {registry path: {lowercased value name: value}}, with None for
+              keys that don't exist; None when the registry is unavailable
+    """
     system = platform.system()
     
     if system != "Windows":
@@ -70,10 +103,10 @@ def get_aldelo_db_path():
         logger.error("winreg module not available. This feature requires Windows.")
         return None
     
-    # Try each registry path
+    wanted = {name.lower() for name in REGISTRY_KEYS}
+    registry = {}
     for reg_path in REGISTRY_PATHS:
-        logger.info(f"Checking registry path: HKLM\\{reg_path}")
-        
+        registry[reg_path] = None
         try:
             # Open registry key
             key = winreg.OpenKey(
@@ -83,34 +116,66 @@ def get_aldelo_db_path():
                 winreg.KEY_READ
             )
             
-            # Try each registry value in priority order
-            for value_name in REGISTRY_KEYS:
-                try:
-                    value, _ = winreg.QueryValueEx(key, value_name)
-                    logger.info(f"Found registry key '{value_name}': {value}")
-                    
-                    # Validate the path
-                    db_path = _validate_db_path(value, value_name)
-                    if db_path:
-                        winreg.CloseKey(key)
-                        logger.info(f"✓ Detected Aldelo database at: {db_path}")
-                        return db_path
-                        
-                except FileNotFoundError:
-                    logger.debug(f"Registry value '{value_name}' not found in {reg_path}")
-                    continue
-            
-            winreg.CloseKey(key)
+            # Read every value in one enumeration instead of one query per name
+            try:
+                values = {}
+                index = 0
+                while True:
+                    try:
+                        name, value, _ = winreg.EnumValue(key, index)
+                    except OSError:
+                        break
+                    # Value names are case-insensitive, as with QueryValueEx
+                    if name.lower() in wanted:
+                        values[name.lower()] = value
+                    index += 1
+            finally:
+                winreg.CloseKey(key)
+            registry[reg_path] = values
             
         except FileNotFoundError:
             logger.debug(f"Registry path not found: {reg_path}")
-            continue
         except PermissionError:
             logger.error(f"Permission denied reading registry: {reg_path}")
-            continue
         except Exception as e:
             logger.error(f"Error reading registry path {reg_path}: {e}")
+    
+    return registry
+
+
+def _detect_db_path(registry):
+    """
+    Find the database from registry values read by _read_registry_values,
+    falling back to COMMON_PATHS.
+    
+    Returns:
+        tuple: (db_path, searched_dir) where searched_dir is the folder that
+               was scanned to find it (None when the registry named the file
+               itself); (None, None) if not found
+    """
+    if registry is None:
+        return None, None
+    
+    # Try each registry path
+    for reg_path, values in registry.items():
+        logger.info(f"Checking registry path: HKLM\\{reg_path}")
+        if values is None:
             continue
+        
+        # Try each registry value in priority order
+        for value_name in REGISTRY_KEYS:
+            value = values.get(value_name.lower())
+            if value is None:
+                logger.debug(f"Registry value '{value_name}' not found in {reg_path}")
+                continue
+            
+            logger.info(f"Found registry key '{value_name}': {value}")
+            
+            # Validate the path
+            db_path = _validate_db_path(value, value_name)
+            if db_path:
+                logger.info(f"✓ Detected Aldelo database at: {db_path}")
+                return db_path, (value if db_path != value else None)
     
     logger.error("Could not detect Aldelo database path from registry")
     
@@ -121,9 +186,9 @@ def get_aldelo_db_path():
             db_path = _validate_db_path(path, "CommonPath")
             if db_path:
                 logger.info(f"✓ Detected Aldelo database in common path: {db_path}")
-                return db_path
+                return db_path, path
                 
-    return None
+    return None, None
 
 
 def _validate_db_path(path, key_name):
@@ -148,73 +213,65 @@ def _validate_db_path(path, key_name):
             logger.warning(f"Database file not found: {path}")
             return None
     
-    # If it's a directory (DataPath, InstallPath), try default filenames
+    # If it's a directory (DataPath, InstallPath), search it with one bounded walk
     if os.path.isdir(path):
         logger.info(f"Path is directory, searching for database files: {path}")
+        db_path = _find_db_in_dir(path)
+        if db_path:
+            return db_path
+    
+    logger.warning(f"Could not validate database path from {key_name}: {path}")
+    return None
+
+
+def _find_db_in_dir(path):
+    """
+    Find the live database under `path` in a single os.walk, reaching the
+    directory itself, its subfolders (minus _SKIP_DIRS) and the subfolders
+    of its 'Data' folder. Handles custom names like "SANTA LUCIA 2020.mdb"
+    and layouts like Databases\\Live\\StoreName\\Database.mdb.
+    
+    Preference: files directly in `path`, then under 'Data', then in other
+    subfolders; shallower first; default names before others; then the
+    largest file, assuming it's the live DB.
+    """
+    best_match, best_rank = None, None
+    
+    def log_error(e):
+        logger.warning(f"Error scanning directory {e.filename}: {e}")
+    
+    for root, dirs, files in os.walk(path, onerror=log_error):
+        rel = os.path.relpath(root, path)
+        parts = [] if rel == os.curdir else rel.split(os.sep)
+        depth = len(parts)
+        in_data = depth > 0 and parts[0].lower() == "data"
         
-        # 1. Try generic default names first
-        for db_name in DEFAULT_DB_NAMES:
-            full_path = os.path.join(path, db_name)
-            if os.path.isfile(full_path):
-                logger.info(f"Found database file (default name): {full_path}")
-                return full_path
+        for name in files:
+            # Excludes backups and temp files
+            if not _LIVE_DB_RE.match(name):
+                continue
+            full_path = os.path.join(root, name)
+            try:
+                size = os.stat(full_path).st_size
+            except OSError:
+                continue
+            rank = (depth > 0 and not in_data, depth, name.lower() not in _DEFAULT_DB_NAMES, -size)
+            if best_rank is None or rank < best_rank:
+                best_match, best_rank = full_path, rank
         
-        # 2. Heuristic: Search for ANY .mdb/.accdb file in the directory
-        # This handles custom names like "SANTA LUCIA 2020.mdb"
-        try:
-            candidates = []
-            for f in os.listdir(path):
-                if f.lower().endswith(('.mdb', '.accdb')):
-                    # Exclude backups or temp files
-                    if "backup" in f.lower() or f.startswith("~"):
-                        continue
-                    full_path = os.path.join(path, f)
-                    if os.path.isfile(full_path):
-                        size = os.path.getsize(full_path)
-                        candidates.append((full_path, size))
-            
-            if candidates:
-                # Pick the largest file, assuming it's the live DB
-                candidates.sort(key=lambda x: x[1], reverse=True)
-                best_match = candidates[0][0]
-                logger.info(f"Found database file (heuristic match): {best_match}")
-                return best_match
-        except Exception as e:
-            logger.warning(f"Error scanning directory {path}: {e}")
-
-        # 3. Repeat checks in 'Data' subdirectory
-        data_path = os.path.join(path, "Data")
-        if os.path.isdir(data_path):
-            # Recurse one level into Data folder
-            res = _validate_db_path(data_path, "DataSubdir")
-            if res:
-                return res
+        # Anything directly in the folder beats its subfolders
+        if depth == 0 and best_match:
+            break
         
-        # 4. Recursive Heuristic: Check one level of subdirectories
-        # This handles structure like Databases\Live\StoreName\Database.mdb
-        logger.info(f"Searching subdirectories of: {path}")
-        try:
-            for item in os.listdir(path):
-                sub_path = os.path.join(path, item)
-                if os.path.isdir(sub_path):
-                    # Skip folders we already checked or that are unlikely to hold the live DB
-                    if item.lower() in ["data", "backup", "logs", "temp", "backups", "export", "images"]:
-                        continue
-                        
-                    # Search for any .mdb in this subfolder
-                    for f in os.listdir(sub_path):
-                        if f.lower().endswith(('.mdb', '.accdb')):
-                            if "backup" in f.lower() or f.startswith("~"):
-                                continue
-                            full_path = os.path.join(sub_path, f)
-                            if os.path.isfile(full_path):
-                                logger.info(f"Found database file in subfolder '{item}': {full_path}")
-                                return full_path
-        except Exception as e:
-            logger.warning(f"Error scanning subdirectories of {path}: {e}")
+        # Only the folder itself and its Data folder are searched below one level
+        if depth == 0 or (depth == 1 and in_data):
+            dirs[:] = [d for d in dirs if d.lower() == "data" or d.lower() not in _SKIP_DIRS]
+        else:
+            dirs[:] = []
     
-    logger.warning(f"Could not validate database path from {key_name}: {path}")
-    return None
+    if best_match:
+        logger.info(f"Found database file: {best_match}")
+    return best_match
 
 
 def get_db_path_with_fallback(config):
@@ -227,10 +284,16 @@ def get_db_path_with_fallback(config):
     Returns:
         str: Database path or None
     """
-    # 1. Try registry if enabled
+    # 1. Try registry if enabled (a previously detected path is checked first)
     if config.get("use_registry", True):
-        db_path = get_aldelo_db_path()
+        registry = _read_registry_values()
+        db_path = _read_cached_db_path(registry)
+        if db_path:
+            return db_path
+        
+        db_path, searched_dir = _detect_db_path(registry)
         if db_path:
+            _write_cached_db_path(db_path, registry, searched_dir)
             return db_path
         logger.warning("Registry detection failed, falling back to config")
     
@@ -242,3 +305,72 @@ def get_db_path_with_fallback(config):
     
     logger.error("No valid database path found (registry or config)")
     return None
+
+
+def _dir_mtime(path):
+    """st_mtime_ns of a directory, or None if it can't be read."""
+    try:
+        return os.stat(path).st_mtime_ns
+    except (OSError, TypeError):
+        return None
+
+
+def _cache_entry_valid(entry, registry):
+    """
+    A cached detection still holds if the file exists, the registry values
+    it was derived from are unchanged, and the folder that was scanned to
+    find it has not had entries added, removed or renamed since.
+    """
+    db_path = entry.get("db_path")
+    if not db_path or not os.path.isfile(db_path):
+        return False
+    if entry.get("registry") != registry:
+        return False
+    searched_dir = entry.get("searched_dir")
+    if searched_dir and _dir_mtime(searched_dir) != entry.get("searched_dir_mtime"):
+        return False
+    return True
+
+
+def _read_cached_db_path(registry):
+    """
+    Return the last detected database path if it is still valid for the
+    current registry values (see _cache_entry_valid), checking memory
+    first and then DB_PATH_CACHE_FILE. None otherwise.
+    """
+    global _cached_db_path
+    
+    if _cached_db_path and _cache_entry_valid(_cached_db_path, registry):
+        return _cached_db_path["db_path"]
+    
+    try:
+        with open(DB_PATH_CACHE_FILE, 'r', encoding='utf-8') as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    
+    if isinstance(entry, dict) and _cache_entry_valid(entry, registry):
+        logger.info(f"Using cached database path: {entry['db_path']}")
+        _cached_db_path = entry
+        return entry["db_path"]
+    
+    _cached_db_path = None
+    return None
+
+
+def _write_cached_db_path(db_path, registry, searched_dir):
+    """Remember a detected database path in memory and in DB_PATH_CACHE_FILE."""
+    global _cached_db_path
+    _cached_db_path = {
+        "db_path": db_path,
+        "registry": registry,
+        "searched_dir": searched_dir,
+        "searched_dir_mtime": _dir_mtime(searched_dir) if searched_dir else None
+    }
+    
+    try:
+        os.makedirs(os.path.dirname(DB_PATH_CACHE_FILE), exist_ok=True)
+        with open(DB_PATH_CACHE_FILE, 'w', encoding='utf-8') as f:
+            json.dump(_cached_db_path, f)
+    except (OSError, TypeError, ValueError) as e:
+        logger.debug(f"Could not write database path cache: {e}")
@@ -0,0 +1,42 @@
+"""
+Shared setup for the manual test_*.py scripts.
+
+Detects the Aldelo database and opens one connection that the whole script
+reuses, so each run pays for the provider handshake only once.
+"""
+
+import logging
+from contextlib import contextmanager
+
+from utils.db_connector import get_connection, DatabaseConnectionError
+from utils.registry_reader import get_db_path_with_fallback
+
+logger = logging.getLogger("WindowsAgent.TestHelpers")
+
+
+@contextmanager
+def open_aldelo(config, db_path=None, strategy="oledb", read_only=True):
+    """
+    Open the Aldelo database and yield (conn, db_path).
+
+    Args:
+        config: Configuration dict used for path detection
+        db_path: Already detected path; detected from config when omitted
+        strategy: Connection strategy passed to get_connection
+        read_only: If True, open in read-only mode
+
+    Raises:
+        DatabaseConnectionError: If no database path is found or all
+                                 connection strategies fail
+        FileNotFoundError: If the database file does not exist
+    """
+    if not db_path:
+        db_path = get_db_path_with_fallback(config)
+    if not db_path:
+        raise DatabaseConnectionError("No valid database path found (registry or config)")
+
+    conn = get_connection(db_path, strategy=strategy, read_only=read_only)
+    try:
+        yield conn, db_path
+    finally:
+        conn.close()